@@ -0,0 +1,195 @@
+"""
+Run this file to process a job file of SIR sweeps without plotting, e.g. on a headless batch node
+
+Every job sweeps the effective strengths of the virus (the beta of fig_5_right, with delta set to the largest
+eigenvalue) for one or more initial sizes on one data set. Each finished point is written as one JSON line as
+soon as it is done, followed by one line per job with its tipping points. Neither matplotlib nor networkx is
+imported (networkx only for the 'gillespie' engine), loaded graphs and worker pools are reused by later jobs
+on the same data set, so small jobs cost little more than their simulations.
+
+Usage:
+    python batchRunner.py JOBFILE [--output FILE]
+
+    JOBFILE -- a JSON file {"defaults": {...}, "jobs": [{...}, ...]}, the entries of "defaults" apply to every
+        job that does not set them itself. Keys of a job:
+            dataset -- path of the edge list, relative to the job file (required)
+            separator -- character seperating the two connected nodes (default: null, any whitespace)
+            name -- the name of the job in the output (default: its position in the job list)
+            betas -- list of effective strengths, or {"start": ..., "stop": ..., "steps": ...} for logarithmically
+                spaced ones (default: {"start": 0.01, "stop": 100, "steps": 20})
+            initial_sizes -- list of initial numbers of infected nodes (default: [10])
+            initial_nodes -- 'random', or 'degree' / 'eigenvector' for the most central nodes (default: 'random')
+            iterations -- simulations per point, the maximum number if rel_width is set (default: 100)
+            rel_width, batch -- sequential sampling of the points, see time_evolution (default: null, 20)
+            start_time, end_time -- the simulated time span (default: 0, 100)
+            engine -- a key of sirFunctions.ENGINES or a batch engine (default: 'csr')
+            workers -- number of worker processes, null for one per CPU core (default: 1)
+            seed -- seed of the job file, null for unseeded runs (default: 0)
+            seed_strategy -- 'per_job' to derive an independent seed for every job from seed,
+                'shared' to run every job with seed itself (default: 'per_job')
+            store -- directory of a results store, relative to the job file (default: null, no store)
+    --output -- the file the JSON lines are appended to (default: standard output)
+
+The exit code is 1 if a job failed (its error is written as a JSON line, the other jobs still run).
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+from calculateLambda import graphDigest, obtainMaxEig
+from centrality import centralityIndex
+from fetchData import loadGraph
+from sirFunctions import ENGINES, BATCH_ENGINES, replicate_pool, replicate_seeds, time_evolution, tipping_point
+
+DEFAULTS = {'separator': None, 'betas': {'start': 0.01, 'stop': 100, 'steps': 20}, 'initial_sizes': [10],
+            'initial_nodes': 'random', 'iterations': 100, 'rel_width': None, 'batch': 20, 'start_time': 0,
+            'end_time': 100, 'engine': 'csr', 'workers': 1, 'seed': 0, 'seed_strategy': 'per_job', 'store': None}
+
+
+def betaRange(betas):
+    """Returns the list of effective strengths given as list or as {"start", "stop", "steps"} of a logarithmic grid"""
+
+    if isinstance(betas, dict):
+        return np.logspace(np.log10(betas['start']), np.log10(betas['stop']), betas['steps']).tolist()
+    return [float(beta) for beta in betas]
+
+
+def jobSeeds(seed, strategy, number_of_jobs):
+    """Returns the seed of every job for the seed strategy of the job file"""
+
+    if seed is None:
+        return [None] * number_of_jobs
+    if strategy == 'shared':
+        return [seed] * number_of_jobs
+    if strategy == 'per_job':
+        return replicate_seeds(seed, number_of_jobs)
+    raise ValueError("Unknown seed strategy " + str(strategy))
+
+
+class Runner(object):
+    """Runs jobs one after the other, keeping the graph and the worker pool of the last data set
+
+    Arguments:
+        directory -- the directory relative paths of the jobs are resolved against
+        emit -- function receiving every output object
+    """
+
+    def __init__(self, directory, emit):
+        self.directory = directory
+        self.emit = emit
+        self.graphs = {}
+        self.pool = None
+        self.pool_key = None
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+            self.pool_key = None
+
+    def graph(self, path, separator, engine):
+        """Returns the graph of a data set in the form the engine needs, loading each form only once"""
+
+        key = (path, separator, engine == 'gillespie')
+        if key not in self.graphs:
+            self.graphs[key] = loadGraph(path, separator, output='graph' if engine == 'gillespie' else 'csr')
+            if self.graphs[key] is None:
+                raise ValueError("Cannot load " + path)
+        return self.graphs[key]
+
+    def workers(self, G, key, workers):
+        """Returns the workers argument of time_evolution, a pool shared with the previous job if possible"""
+
+        if workers == 1:
+            return 1
+        if self.pool_key != (key, workers):
+            self.close()
+            self.pool = replicate_pool(G, workers)
+            self.pool_key = (key, workers)
+        return self.pool
+
+    def run(self, name, job, seed):
+        """Runs one job and emits its points and its summary"""
+
+        started = time.perf_counter()
+        engine = job['engine']
+        if engine not in ENGINES and engine not in BATCH_ENGINES:
+            raise ValueError("Unknown engine " + str(engine))
+        path = os.path.join(self.directory, job['dataset'])
+        G = self.graph(path, job['separator'], engine)
+        eig = obtainMaxEig(G)
+        betas = betaRange(job['betas'])
+        initial_sizes = job['initial_sizes']
+        seeds = replicate_seeds(seed, len(initial_sizes) * len(betas))
+        workers = self.workers(G, (path, job['separator'], engine == 'gillespie'),
+                               1 if engine in BATCH_ENGINES else job['workers'])
+        store = None if job['store'] is None else os.path.join(self.directory, job['store'])
+        digest = graphDigest(G) if store is not None and seed is not None else None  # the graph part of the store keys
+        thresholds = []
+        for j, initial_size in enumerate(initial_sizes):
+            if job['initial_nodes'] == 'random':
+                initial_nodes = []
+            else:
+                initial_nodes = centralityIndex(G, job['initial_nodes']).top(initial_size)
+            means = []
+            for i, beta in enumerate(betas):
+                point_started = time.perf_counter()
+                point = time_evolution(G, beta, eig, initial_size, job['start_time'], job['end_time'], job['iterations'], "",
+                                       opt='final_size_statistics', initial_nodes=initial_nodes, engine=engine,
+                                       workers=workers, seed=seeds[j * len(betas) + i], rel_width=job['rel_width'],
+                                       batch=job['batch'], store=store, digest=digest)
+                means.append(point['mean'])
+                self.emit({'type': 'point', 'job': name, 'dataset': job['dataset'], 'engine': engine,
+                           'initial_size': initial_size, 'beta': beta, 'mean': point['mean'],
+                           'interval': list(point['interval']), 'runs': point['runs'], 'seed': seeds[j * len(betas) + i],
+                           'seconds': time.perf_counter() - point_started})
+            thresholds.append(tipping_point(betas, means) if len(betas) > 1 else None)
+        self.emit({'type': 'job', 'job': name, 'dataset': job['dataset'], 'eig': float(eig),
+                   'initial_sizes': initial_sizes, 'tipping_points': thresholds, 'seed': seed,
+                   'seconds': time.perf_counter() - started})
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(description="Runs the SIR sweeps of a job file and writes the points as JSON lines")
+    parser.add_argument('jobfile')
+    parser.add_argument('--output', default=None)
+    options = parser.parse_args(arguments)
+
+    with open(options.jobfile) as jobFile:
+        specification = json.load(jobFile)
+    defaults = dict(DEFAULTS)
+    defaults.update(specification.get('defaults', {}))
+    jobs = [dict(defaults, **job) for job in specification['jobs']]
+    seeds = jobSeeds(defaults['seed'], defaults['seed_strategy'], len(jobs))
+
+    output = sys.stdout if options.output is None else open(options.output, 'a')
+
+    def emit(entry):
+        output.write(json.dumps(entry) + '\n')
+        output.flush()
+
+    failed = 0
+    runner = Runner(os.path.dirname(os.path.abspath(options.jobfile)), emit)
+    try:
+        for k, job in enumerate(jobs):
+            name = job.get('name', k)
+            # a seed set in the job itself takes precedence over the one derived from the job file
+            seed = job['seed'] if 'seed' in specification['jobs'][k] else seeds[k]
+            try:
+                runner.run(name, job, seed)
+            except Exception as error:  # a failed job must not stop the others
+                failed += 1
+                emit({'type': 'error', 'job': name, 'error': "%s: %s" % (type(error).__name__, error)})
+    finally:
+        runner.close()
+        if output is not sys.stdout:
+            output.close()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,197 @@
+"""
+Run this file to benchmark the graph loaders, the eigensolver, the centrality measures and the SIR engines
+
+The bundled data sets (terrorist, as-oregon, facebook_ego) and synthetic graphs with 10k, 100k and 1M edges
+(generated locally, with a heavy-tailed degree distribution) are used. The results are written to a JSON file
+and compared against a stored baseline, reporting every measurement that got worse by more than a threshold.
+
+Usage:
+    python benchmark.py [--quick] [--output FILE] [--baseline FILE] [--save-baseline] [--threshold FRACTION]
+
+    --quick -- skips the synthetic graph with 1M edges
+    --output -- the result file (default: benchmark_results.json next to this file)
+    --baseline -- the baseline file (default: benchmark_baseline.json next to this file)
+    --save-baseline -- stores the results as the new baseline instead of comparing against it
+    --threshold -- relative change counted as a regression (default: 0.2)
+
+The exit code is 1 if a regression was found.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from calculateLambda import obtainMaxEig
+from centrality import CentralityIndex
+from csrGraph import CSRGraph
+from fetchData import importEdgeListFile, loadGraph, csrToGraph
+from gillespieAlgorithm import Gillespie_SIR, Gillespie_SIR_CSR, fast_SIR
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DATASETS = [('terrorist', os.path.join(HERE, 'data', 'terrorist.txt'), '\t'),
+            ('as-oregon', os.path.join(HERE, 'data', 'as-oregon', 'as20000102.txt'), '\t'),
+            ('facebook_ego', os.path.join(HERE, 'data', 'facebook_ego.txt'), ' ')]
+SYNTHETIC_EDGES = [10000, 100000, 1000000]
+NETWORKX_MAX_EDGES = 100000  # larger graphs are only benchmarked with the CSR code paths
+STRENGTH = 3  # effective strength eig*tau/gamma of the benchmarked epidemics
+REPEAT = 3  # timings are the best of this many runs
+NOISE_FLOOR = 1e-3  # timings changing by less than this many seconds are never counted as regressions
+
+
+def bestTime(function, repeat=REPEAT):
+    """Returns the shortest wall time of several calls and the result of the last call"""
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def peakMemory(function):
+    """Returns the peak memory in MB allocated (via Python or numpy) during a call"""
+
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def syntheticEdgeList(path, number_of_edges, seed=0):
+    """Writes a random edge list with a heavy-tailed degree distribution (Chung-Lu model, 10 edges per node on average)
+
+    Arguments:
+        path -- the file to write
+        number_of_edges -- the number of edge lines (a few are merged duplicates in the graph)
+        seed -- seed of the generator (default: 0)
+    """
+
+    rng = np.random.default_rng(seed)
+    number_of_nodes = max(number_of_edges // 5, 10)
+    weights = rng.pareto(2.5, number_of_nodes) + 1
+    edges = rng.choice(number_of_nodes, size=(number_of_edges, 2), p=weights / weights.sum())
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    np.savetxt(path, edges, fmt='%d', delimiter='\t')
+
+
+def weightedCopy(H, seed=0):
+    """Returns a copy of a CSRGraph with edge weights drawn uniformly from [0.5, 1.5)"""
+
+    upper = H.sources <= H.indices
+    weights = np.random.default_rng(seed).uniform(0.5, 1.5, np.count_nonzero(upper))
+    return CSRGraph.fromEdges(np.column_stack((H.sources[upper], H.indices[upper])), len(H), H.nodes, weights)
+
+
+def benchmarkGraph(name, path, separator, results):
+    """Adds the measurements of one graph file to results"""
+
+    def record(measurement, value, unit, better):
+        results[name + '/' + measurement] = {'value': value, 'unit': unit, 'better': better}
+        print("  %-28s %12.4g %s" % (measurement, value, unit))
+
+    print(name)
+    with open(path) as edgeFile:
+        number_of_edges = sum(1 for _ in edgeFile)
+    with_networkx = number_of_edges <= NETWORKX_MAX_EDGES
+    if with_networkx:
+        record('load networkx', bestTime(lambda: importEdgeListFile(path, separator))[0], 's', 'lower')
+        record('load networkx memory', peakMemory(lambda: importEdgeListFile(path, separator)), 'MB', 'lower')
+    record('load csr', bestTime(lambda: loadGraph(path, separator, output='csr', cache=False))[0], 's', 'lower')
+    record('load csr memory', peakMemory(lambda: loadGraph(path, separator, output='csr', cache=False)), 'MB', 'lower')
+    loadGraph(path, separator, output='csr')  # writes the binary cache
+    load_time, H = bestTime(lambda: loadGraph(path, separator, output='csr'))
+    record('load cached', load_time, 's', 'lower')
+
+    eig_time, eig = bestTime(lambda: obtainMaxEig(H, cache=False))
+    record('eigensolver', eig_time, 's', 'lower')
+    record('centrality degree', bestTime(lambda: CentralityIndex(H, 'degree'))[0], 's', 'lower')
+    record('centrality eigenvector', bestTime(lambda: CentralityIndex(H, 'eigenvector'))[0], 's', 'lower')
+
+    gamma = 1.0
+    tau = STRENGTH * gamma / eig
+    initial_infecteds = random.Random(0).sample(H.nodes, min(10, len(H)))
+    weighted = weightedCopy(H)
+    engines = [('gillespie csr', Gillespie_SIR_CSR, H), ('gillespie weighted', Gillespie_SIR_CSR, weighted),
+               ('fast', fast_SIR, H), ('fast weighted', fast_SIR, weighted)]
+    if with_networkx:
+        engines.append(('gillespie', Gillespie_SIR, csrToGraph(H)))
+    for engine_name, engine, network in engines:
+        def simulate():
+            random.seed(0)
+            return engine(network, tau, gamma, initial_infecteds)[0]
+        simulation_time, times = bestTime(simulate)
+        record(engine_name + ' events', (len(times) - 1) / simulation_time, 'events/s', 'higher')
+
+
+def compare(results, baseline, threshold):
+    """Prints the relative change of every measurement against the baseline and returns the regressions"""
+
+    regressions = []
+    for key, result in sorted(results.items()):
+        if key not in baseline:
+            continue
+        old, new = baseline[key]['value'], result['value']
+        change = (new - old) / old if old else 0.0
+        worse = change > threshold if result['better'] == 'lower' else change < -threshold
+        if result['unit'] == 's' and abs(new - old) < NOISE_FLOOR:
+            worse = False
+        if worse:
+            regressions.append(key)
+        print("%-50s %12.4g -> %12.4g %s (%+.0f%%)%s" % (key, old, new, result['unit'], 100 * change,
+                                                          "  REGRESSION" if worse else ""))
+    return regressions
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(description="Benchmarks the graph loaders, eigensolver, centrality and SIR engines")
+    parser.add_argument('--quick', action='store_true', help="skip the synthetic graph with 1M edges")
+    parser.add_argument('--output', default=os.path.join(HERE, 'benchmark_results.json'))
+    parser.add_argument('--baseline', default=os.path.join(HERE, 'benchmark_baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    options = parser.parse_args(arguments)
+
+    results = {}
+    for name, path, separator in DATASETS:
+        benchmarkGraph(name, path, separator, results)
+    with tempfile.TemporaryDirectory() as directory:
+        for number_of_edges in SYNTHETIC_EDGES:
+            if options.quick and number_of_edges >= 1000000:
+                continue
+            path = os.path.join(directory, 'synthetic-%d.txt' % number_of_edges)
+            syntheticEdgeList(path, number_of_edges)
+            benchmarkGraph('synthetic-%d' % number_of_edges, path, '\t', results)
+
+    report = {'meta': {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.platform(),
+                       'date': time.strftime('%Y-%m-%d %H:%M:%S')},
+              'results': results}
+    with open(options.output, 'w') as resultFile:
+        json.dump(report, resultFile, indent=2)
+    print("Results written to " + options.output)
+
+    if options.save_baseline:
+        with open(options.baseline, 'w') as baselineFile:
+            json.dump(report, baselineFile, indent=2)
+        print("Baseline written to " + options.baseline)
+        return 0
+    if not os.path.exists(options.baseline):
+        print("No baseline found, store one with --save-baseline")
+        return 0
+    with open(options.baseline) as baselineFile:
+        baseline = json.load(baselineFile)['results']
+    regressions = compare(results, baseline, options.threshold)
+    print(str(len(regressions)) + " regressions")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -2,8 +2,17 @@
 
 import numpy as np
 import scipy as sp
-import networkx as ntx
 import sys
+import os
+import json
+import hashlib
+from collections import OrderedDict
+from csrGraph import CSRGraph
+
+# Memoization of obtainMaxEig, keyed by graphFingerprint
+EIG_CACHE_SIZE = 64  # number of eigenvalues kept in memory (least recently used ones are dropped)
+_eig_cache = OrderedDict()
+_eig_cache_dir = None  # directory of the optional on-disk tier
 
 
 def maxEig(A):
@@ -16,22 +25,167 @@ def maxEig(A):
     return abs(eigenVals[0])
 
 
-def obtainMaxEig(G, out=False, digits=0):
+def maxEigPair(A, v0=None, tol=0):
+    """Returns the largest eigenvalue and the corresponding eigenvector (normalised, non-negative sum) of a symmetric
+    non-negative matrix
+
+    Arguments:
+        A -- a real symmetric N x N matrix or scipy LinearOperator with non-negative entries
+        v0 -- start vector of the iteration, e.g. the eigenvector of a slightly changed matrix (default: None, random)
+        tol -- relative accuracy of the eigenvalue (default: 0, machine precision)
+    """
+
+    eigenVals, eigenVecs = sp.sparse.linalg.eigsh(A, k=1, which='LA', v0=v0, tol=tol)
+    vector = eigenVecs[:, 0]
+    if vector.sum() < 0:
+        vector = -vector
+    return eigenVals[0], vector
+
+
+def _adjacency(G):
+    """Returns the sparse adjacency matrix of a networkX graph or CSRGraph (networkX is only imported for the former)"""
+
+    if isinstance(G, CSRGraph):
+        return G.adjacency()
+    import networkx as ntx
+    return ntx.adjacency_matrix(G)
+
+
+def obtainMaxEigPair(G, v0=None):
+    """Returns the largest eigenvalue and the leading eigenvector of the adjacency matrix belonging to a graph
+
+    The entries of the eigenvector follow the node order of G (list(G) for networkX graphs, G.nodes for CSRGraphs).
+
+    Arguments:
+        G -- a networkX graph object or CSRGraph
+        v0 -- start vector of the iteration (default: None, random)
+    """
+
+    A = _adjacency(G)
+    return maxEigPair(A.astype(float), v0)
+
+
+def graphFingerprint(G):
+    """Returns a cheap structural hash of a graph built from node count, edge count and a digest of the degree sequence
+
+    Any node or edge removal or addition changes the fingerprint. Degree-preserving rewiring does not,
+    and neither do changed edge weights of a networkX graph, so clear the cache (clearEigCache) after such
+    operations. The weights of a weighted CSRGraph are part of the digest.
+
+    Arguments:
+        G -- a networkX graph object or CSRGraph
+    """
+
+    if isinstance(G, CSRGraph):
+        degrees = G.degrees() + G.selfLoops()
+    else:
+        degrees = np.fromiter((d for _, d in G.degree), dtype=np.int64, count=len(G))
+    digest = hashlib.sha1(np.ascontiguousarray(degrees, dtype=np.int64).tobytes())
+    if isinstance(G, CSRGraph) and G.weights is not None:
+        digest.update(np.ascontiguousarray(G.weights).tobytes())
+    digest = digest.hexdigest()[:16]
+    return "%d-%d-%s" % (len(G), G.number_of_edges(), digest)
+
+
+def graphDigest(G):
+    """Returns a hash of the node labels and the edges of a graph (and the weights of a weighted CSRGraph)
+
+    Unlike graphFingerprint, it changes with any relabelling or rewiring of the graph. It depends on the
+    order of the nodes and neighbours, so equal graphs built in a different order may have different digests.
+
+    Arguments:
+        G -- a networkX graph object or CSRGraph
+    """
+
+    if not isinstance(G, CSRGraph):
+        G = CSRGraph.fromGraph(G)
+    digest = hashlib.sha1(repr(G.nodes).encode())
+    digest.update(np.ascontiguousarray(G.indptr, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(G.indices, dtype=np.int64).tobytes())
+    if G.weights is not None:
+        digest.update(np.ascontiguousarray(G.weights, dtype=float).tobytes())
+    return digest.hexdigest()
+
+
+def setEigCacheDir(path):
+    """Enables the on-disk tier of the eigenvalue cache in the given directory (None disables it)
+
+    Arguments:
+        path -- a directory, created if it does not exist
+    """
+
+    global _eig_cache_dir
+    if path is not None:
+        os.makedirs(path, exist_ok=True)
+    _eig_cache_dir = path
+
+
+def clearEigCache(disk=False):
+    """Empties the in-memory eigenvalue cache
+
+    Arguments:
+        disk -- when True, the files of the on-disk tier are removed as well (default False)
+    """
+
+    _eig_cache.clear()
+    if disk and _eig_cache_dir is not None:
+        for name in os.listdir(_eig_cache_dir):
+            if name.endswith('.eig.json'):
+                os.remove(os.path.join(_eig_cache_dir, name))
+
+
+def _cachedEig(key):
+    """Returns the cached eigenvalue belonging to a fingerprint or None"""
+
+    if key in _eig_cache:
+        _eig_cache.move_to_end(key)
+        return _eig_cache[key]
+    if _eig_cache_dir is not None:
+        try:
+            with open(os.path.join(_eig_cache_dir, key + '.eig.json'), "r") as cacheFile:
+                ret = json.load(cacheFile)['eig']
+        except (OSError, ValueError, KeyError):
+            return None
+        _storeEig(key, ret, disk=False)
+        return ret
+    return None
+
+
+def _storeEig(key, eig, disk=True):
+    """Adds an eigenvalue to the cache tiers"""
+
+    _eig_cache[key] = eig
+    _eig_cache.move_to_end(key)
+    while len(_eig_cache) > EIG_CACHE_SIZE:
+        _eig_cache.popitem(last=False)
+    if disk and _eig_cache_dir is not None:
+        path = os.path.join(_eig_cache_dir, key + '.eig.json')
+        with open(path + '.%d.tmp' % os.getpid(), "w") as cacheFile:
+            json.dump({'eig': eig}, cacheFile)
+        os.replace(path + '.%d.tmp' % os.getpid(), path)
+
+
+def obtainMaxEig(G, out=False, digits=0, cache=True):
     """Returns the largest eigenvalue (absolute value) of the adjacency matrix belonging to a graph
 
     Arguments:
-        G -- a networkX graph object
+        G -- a networkX graph object or CSRGraph
         out -- when True, the eigenvalue is printed to the console (default False)
         digits -- the rounding accuracy of the printed eigenvalue (default 0)
+        cache -- when True, the eigenvalue is looked up in and stored to the eigenvalue cache (default True)
     """
 
-    A = ntx.adjacency_matrix(G)
-    try:
-        ret = maxEig(A)
-    except np.linalg.LinAlgError:
-        print("Cannot calculate eigenvalues!", file=sys.stderr)
-        return 0
+    key = graphFingerprint(G) if cache else None
+    ret = _cachedEig(key) if cache else None
+    if ret is None:
+        A = _adjacency(G)
+        try:
+            ret = maxEig(A)
+        except np.linalg.LinAlgError:
+            print("Cannot calculate eigenvalues!", file=sys.stderr)
+            return 0
+        if cache:
+            _storeEig(key, float(ret))
     if out:
         print(np.round(ret, digits))
     return ret
-
@@ -1,40 +1,138 @@
 """Provides functions to determine the critical nodes of a graph using different algorithms"""
 
-import networkx as ntx
-import operator
+import weakref
+import numpy as np
+from collections import OrderedDict
+from calculateLambda import obtainMaxEigPair, graphDigest
+from csrGraph import CSRGraph
+
+# Memoization of centralityIndex, keyed by graphDigest and measure
+INDEX_CACHE_SIZE = 16  # number of indices kept (least recently used ones are dropped)
+_index_cache = OrderedDict()
+# Indices of the graph objects queried before, with the numbers of nodes and edges they were computed for
+_graph_indices = weakref.WeakKeyDictionary()
+
+
+def degreeScores(G):
+    """Returns the degree centrality (degree divided by N-1, a self-loop counts twice) of every node
+
+    Arguments:
+        G -- a CSRGraph
+    """
+
+    return (G.degrees() + G.selfLoops()) / max(len(G) - 1, 1)
+
+
+def eigenvectorScores(G):
+    """Returns the eigenvector centrality (the normalised leading eigenvector of the adjacency matrix) of every node
+
+    Arguments:
+        G -- a CSRGraph
+    """
+
+    return obtainMaxEigPair(G)[1]
+
+
+# Centrality measures available in CentralityIndex
+MEASURES = {'degree': degreeScores, 'eigenvector': eigenvectorScores}
+
+
+class CentralityIndex(object):
+    """Ranking of the nodes of a graph by a centrality measure, computed once
+
+    Nodes with equal scores keep the node order of the graph.
+
+    Arguments:
+        G -- a networkX graph object or CSRGraph
+        measure -- a key of MEASURES
+    """
+
+    def __init__(self, G, measure):
+        if not isinstance(G, CSRGraph):
+            G = CSRGraph.fromGraph(G)
+        self.measure = measure
+        self.nodes = G.nodes
+        self.scores = MEASURES[measure](G)
+        self.ranking = np.argsort(-self.scores, kind='stable')
+        self._position = None
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def top(self, number_of_nodes=1):
+        """Returns the labels of the number_of_nodes most central nodes, most central first"""
+
+        return [self.nodes[i] for i in self.ranking[:number_of_nodes].tolist()]
+
+    def score(self, node):
+        """Returns the centrality of the node with the given label"""
+
+        if self._position is None:
+            self._position = {label: i for i, label in enumerate(self.nodes)}
+        return float(self.scores[self._position[node]])
+
+
+def clearCentralityCache():
+    """Empties the cache of centralityIndex, needed after rewiring a networkX graph in place"""
+
+    _index_cache.clear()
+    _graph_indices.clear()
+
+
+def centralityIndex(G, measure):
+    """Returns the CentralityIndex of a graph, reusing the one of an earlier call on the same graph
+
+    A graph object queried before gets its index back at once as long as its numbers of nodes and edges are
+    unchanged, so repeated queries do not convert the graph again. Other graphs are identified by graphDigest,
+    so a relabelled or rewired copy gets an index of its own. A networkX graph rewired in place without changing
+    these numbers is not detected, call clearCentralityCache after such changes.
+
+    Arguments:
+        G -- a networkX graph object, CSRGraph or CentralityIndex (which is returned as it is)
+        measure -- a key of MEASURES
+    """
+
+    if isinstance(G, CentralityIndex):
+        if G.measure != measure:
+            raise ValueError("The index ranks by %s, not by %s" % (G.measure, measure))
+        return G
+    counts = (len(G), G.number_of_edges())
+    known = _graph_indices.get(G)
+    if known is not None and known[0] == counts and measure in known[1]:
+        return known[1][measure]
+    H = G if isinstance(G, CSRGraph) else CSRGraph.fromGraph(G)
+    key = (graphDigest(H), measure)
+    if key in _index_cache:
+        _index_cache.move_to_end(key)
+        index = _index_cache[key]
+    else:
+        index = CentralityIndex(H, measure)
+        _index_cache[key] = index
+        while len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    if known is None or known[0] != counts:
+        known = _graph_indices[G] = (counts, {})
+    known[1][measure] = index
+    return index
 
 
 def crucialNodesDegree(G, number_of_nodes = 1):
     """ Calculates the nodes with the highest degree betweenness of a graph
 
     Arguments:
-        G -- a networkX graph object
+        G -- a networkX graph object, CSRGraph or CentralityIndex
         number_of_nodes -- the length of the returned list
     """
 
-    d = ntx.degree_centrality(G)
-    ret = []
-    for i in range(number_of_nodes):
-        if d:
-            index = max(d.items(), key=operator.itemgetter(1))[0]
-            ret.append(index)
-            del d[index]
-    return ret
+    return centralityIndex(G, 'degree').top(number_of_nodes)
 
 
 def crucialNodesEigenvector(G, number_of_nodes = 1):
     """ Calculates the nodes with the highest eigenvector betweenness of a graph
 
         Arguments:
-            G -- a networkX graph object
+            G -- a networkX graph object, CSRGraph or CentralityIndex
             number_of_nodes -- the length of the returned list
         """
 
-    d = ntx.eigenvector_centrality(G)
-    ret = []
-    for i in range(number_of_nodes):
-        if d:
-            index = max(d.items(), key=operator.itemgetter(1))[0]
-            ret.append(index)
-            del d[index]
-    return ret
+    return centralityIndex(G, 'eigenvector').top(number_of_nodes)
@@ -0,0 +1,230 @@
+"""Provides a compressed sparse row (CSR) representation of undirected graphs"""
+
+import os
+from array import array
+import numpy as np
+import scipy.sparse
+
+
+class CSRGraph(object):
+    """Undirected graph stored as CSR adjacency arrays with nodes relabelled to 0..N-1
+
+    The neighbours of the node with contiguous index i are indices[indptr[i]:indptr[i+1]],
+    the original label of that node is nodes[i]. Weighted graphs carry the weight of the edge at every
+    CSR position in weights (equal for both directions), unweighted graphs have weights None.
+
+    Arguments:
+        indptr -- integer array of length N+1 with the row offsets
+        indices -- integer array with the concatenated (sorted) neighbour lists
+        nodes -- sequence of the original node labels, ordered by contiguous index
+        weights -- float array of the edge weights aligned with indices (default: None, all weights 1)
+    """
+
+    def __init__(self, indptr, indices, nodes, weights=None):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.nodes = nodes.tolist() if isinstance(nodes, np.ndarray) else list(nodes)
+        self.weights = None if weights is None else np.asarray(weights, dtype=float)
+        self.source = None  # directory the arrays are memory-mapped from, see load
+        self._index = None
+        self._sources = None
+        self._lists = None
+
+    def __reduce__(self):
+        # a memory-mapped graph is reopened from its files instead of being copied into the pickle
+        if self.source is not None:
+            return (CSRGraph.load, (self.source,))
+        return (CSRGraph, (self.indptr, self.indices, self.nodes, self.weights))
+
+    def save(self, directory):
+        """Writes the arrays as .npy files into a directory (created if necessary), node labels must be integers
+
+        Arguments:
+            directory -- the target directory
+        """
+
+        os.makedirs(directory, exist_ok=True)
+        arrays = [('indptr', self.indptr), ('indices', self.indices), ('nodes', np.asarray(self.nodes, dtype=np.int64))]
+        if self.weights is not None:
+            arrays.append(('weights', self.weights))
+        elif os.path.exists(os.path.join(directory, 'weights.npy')):
+            os.remove(os.path.join(directory, 'weights.npy'))
+        for name, values in arrays:
+            path = os.path.join(directory, name + '.npy')
+            with open(path + '.%d.tmp' % os.getpid(), 'wb') as arrayFile:
+                np.save(arrayFile, values)
+            os.replace(path + '.%d.tmp' % os.getpid(), path)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Reads a graph written by save, memory-mapping the arrays read-only by default
+
+        Arguments:
+            directory -- the directory written by save
+            mmap -- when False, the arrays are read into memory (default True)
+        """
+
+        mode = 'r' if mmap else None
+        arrays = [np.load(os.path.join(directory, name + '.npy'), mmap_mode=mode)
+                  for name in ('indptr', 'indices', 'nodes')]
+        weights = os.path.join(directory, 'weights.npy')
+        if os.path.exists(weights):
+            arrays.append(np.load(weights, mmap_mode=mode))
+        graph = cls(*arrays)
+        if mmap:
+            graph.source = os.path.abspath(directory)
+        return graph
+
+    @classmethod
+    def fromGraph(cls, G, weight=None):
+        """Builds the CSR representation of a networkX graph, keeping its node order
+
+        Arguments:
+            G -- a networkX graph object
+            weight -- name of the edge attribute holding the edge weights (default: None, unweighted;
+                edges without the attribute get weight 1)
+        """
+
+        nodes = list(G)
+        index = {node: i for i, node in enumerate(nodes)}
+        edges = np.array([(index[u], index[v]) for u, v in G.edges()], dtype=np.int64).reshape(-1, 2)
+        weights = None
+        if weight is not None:
+            weights = np.fromiter((w for _, _, w in G.edges(data=weight, default=1)), dtype=float, count=len(edges))
+        return cls.fromEdges(edges, len(nodes), nodes, weights)
+
+    @classmethod
+    def fromEdges(cls, edges, number_of_nodes, nodes=None, weights=None):
+        """Builds the CSR representation from an array of contiguous node index pairs
+
+        Self-loops are kept once, duplicated and reversed edges are merged (keeping the weight of the last one).
+
+        Arguments:
+            edges -- integer array of shape (E, 2) with node indices in 0..number_of_nodes-1
+            number_of_nodes -- the number of nodes N
+            nodes -- the original node labels (default: the indices themselves)
+            weights -- float array with the weight of every edge (default: None, unweighted)
+        """
+
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        u, v = edges[:, 0], edges[:, 1]
+        loop = u == v
+        src = np.concatenate([u, v[~loop]])
+        dst = np.concatenate([v, u[~loop]])
+        keys = src * number_of_nodes + dst
+        if weights is None:
+            keys = np.sort(keys)
+            keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+        else:
+            weights = np.asarray(weights, dtype=float)
+            weights = np.concatenate([weights, weights[~loop]])
+            # a stable sort keeps duplicates in input order, the last of every run is kept
+            order = np.argsort(keys, kind='stable')
+            keys, weights = keys[order], weights[order]
+            last = np.concatenate((keys[1:] != keys[:-1], [True]))
+            keys, weights = keys[last], weights[last]
+        src, indices = np.divmod(keys, number_of_nodes)
+        indptr = np.zeros(number_of_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=number_of_nodes), out=indptr[1:])
+        if nodes is None:
+            nodes = range(number_of_nodes)
+        return cls(indptr, indices, nodes, weights)
+
+    @classmethod
+    def fromSparse(cls, A, nodes=None):
+        """Builds the CSR representation of a weighted adjacency matrix, e.g. one read by loadMatrixFile
+
+        Every nonzero entry A[i, j] is an edge with weight A[i, j]; for an asymmetric matrix the entry in
+        the lower triangle wins, as when networkX builds a graph from the same matrix.
+
+        Arguments:
+            A -- a square scipy.sparse matrix
+            nodes -- the original node labels (default: the row numbers)
+        """
+
+        A = scipy.sparse.coo_matrix(A)
+        A.sum_duplicates()
+        nonzero = A.data != 0
+        # entries of the lower triangle come last and override their mirrored entries
+        upper = (A.row <= A.col) & nonzero
+        lower = (A.row > A.col) & nonzero
+        edges = np.concatenate([np.column_stack((A.row[upper], A.col[upper])),
+                                np.column_stack((A.row[lower], A.col[lower]))])
+        weights = np.concatenate([A.data[upper], A.data[lower]])
+        return cls.fromEdges(edges, A.shape[0], nodes, weights)
+
+    @classmethod
+    def fromLabelledEdges(cls, edges):
+        """Builds the CSR representation from an array of node label pairs
+
+        The nodes are numbered in the order of their first appearance, as networkX does when
+        building a graph from the same edge list.
+
+        Arguments:
+            edges -- integer array of shape (E, 2) holding the original node labels
+        """
+
+        flat = np.asarray(edges, dtype=np.int64).reshape(-1)
+        labels, first, inverse = np.unique(flat, return_index=True, return_inverse=True)
+        order = np.argsort(first, kind='stable')
+        rank = np.empty(len(labels), dtype=np.int64)
+        rank[order] = np.arange(len(labels))
+        return cls.fromEdges(rank[inverse].reshape(-1, 2), len(labels), labels[order].tolist())
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def order(self):
+        return len(self)
+
+    def number_of_edges(self):
+        """Returns the number of undirected edges (a self-loop counts once)"""
+
+        loops = np.count_nonzero(self.indices == self.sources)
+        return (len(self.indices) + loops) // 2
+
+    def degrees(self):
+        """Returns the number of CSR entries per node (a self-loop counts once)"""
+
+        return np.diff(self.indptr)
+
+    @property
+    def index(self):
+        """Dictionary mapping original node labels to contiguous indices"""
+
+        if self._index is None:
+            self._index = {node: i for i, node in enumerate(self.nodes)}
+        return self._index
+
+    @property
+    def sources(self):
+        """Array giving, for every CSR position of an edge u->v, the source node u"""
+
+        if self._sources is None:
+            self._sources = np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.indptr))
+        return self._sources
+
+    def selfLoops(self):
+        """Returns a boolean array marking the nodes that are their own neighbour"""
+
+        return np.bincount(self.sources[self.sources == self.indices], minlength=len(self)) > 0
+
+    def toIndices(self, nodes):
+        """Maps an iterable of original node labels to a list of contiguous indices"""
+
+        index = self.index
+        return [index[node] for node in nodes]
+
+    def adjacencyLists(self):
+        """Returns indptr, indices, sources and the self-loop flags as typed arrays for fast scalar access in Python loops"""
+
+        if self._lists is None:
+            self._lists = (array('q', self.indptr.tobytes()), array('q', self.indices.tobytes()),
+                           array('q', self.sources.tobytes()), array('b', self.selfLoops().astype(np.int8).tobytes()))
+        return self._lists
+
+    def adjacency(self):
+        """Returns the adjacency matrix (with the edge weights as entries if the graph is weighted) as a scipy.sparse CSR matrix"""
+
+        data = np.ones(len(self.indices)) if self.weights is None else self.weights
+        return scipy.sparse.csr_matrix((data, self.indices, self.indptr), shape=(len(self), len(self)))
@@ -1,84 +1,283 @@
 """Provides functions to read in graphs from files"""
 
 import numpy as np
-import networkx as ntx
+import scipy.sparse
 import sys
+import os
+import json
+import hashlib
+import warnings
+from itertools import islice
+from csrGraph import CSRGraph
 
 
 def importMatrixFile(path, rowSeparator, columnSeparator):
     """Reads an adjacency matrix file and returns the respective graph
 
+    The file is streamed by loadMatrixFile, which keeps only the nonzero entries.
+
     Arguments:
         path -- path of a non-empty file containing an adjacency matrix
         rowSeparator -- character seperating two rows of the matrix in the file
         columnSeparator -- character seperating two columns of the matrix in the file
     """
 
-    sourceFile = open(path, "r")
-    # first line to create a matrix
-    line = sourceFile.readline()
+    return loadMatrixFile(path, rowSeparator, columnSeparator)
+
+
+def _parseRow(line, rowSeparator, columnSeparator):
+    """Parses one line of an adjacency matrix file into a float array, None if it is malformed"""
+
     # Excludes special characters from imported string (typical cases considered)
-    if line[len(line) - 1] == '\n':
-        line = line[:len(line) - 1]
-    if line[len(line) - 1] == ' ':
-        line = line[:len(line) - 1]
-    if line[len(line) - 1] == rowSeparator:
-        line = line[:len(line) - 1]
-    if line[len(line) - 1] == ' ':
-        line = line[:len(line) - 1]
-    lineElements = line.split(columnSeparator)
-    # Float array to deal with weighted graphs
-    try:
-        lineElements = [float(i) for i in lineElements]
-    except ValueError:
+    line = line.rstrip('\n').rstrip(' ')
+    if rowSeparator and line.endswith(rowSeparator):
+        line = line[:len(line) - len(rowSeparator)].rstrip(' ')
+    numberOfElements = line.count(columnSeparator) + 1
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            row = np.fromstring(line, dtype=float, sep=columnSeparator)
+        except (ValueError, DeprecationWarning):
+            return None
+    return row if len(row) == numberOfElements else None
+
+
+def loadMatrixFile(path, rowSeparator, columnSeparator, output='graph'):
+    """Streams an adjacency matrix file row by row and returns the respective graph
+
+    Only the nonzero entries of every row are kept, so reading takes time linear in the file size and
+    memory proportional to the number of edges. Reading stops at the first blank line.
+
+    Arguments:
+        path -- path of a non-empty file containing an adjacency matrix
+        rowSeparator -- character seperating two rows of the matrix in the file
+        columnSeparator -- character seperating two columns of the matrix in the file
+        output -- the type of the returned graph (default 'graph'):
+            'graph' -- a networkX graph object, with the matrix entries as 'weight' edge attributes
+            'sparse' -- the weighted adjacency matrix as scipy.sparse CSR matrix
+            'csr' -- a CSRGraph with the matrix entries as edge weights
+    """
+
+    rows, columns, weights = [], [], []
+    numberOfRows = 0
+    numberOfColumns = None
+    with open(path, "r") as sourceFile:
+        for line in sourceFile:
+            if line == "\n":
+                break
+            # Float array to deal with weighted graphs
+            row = _parseRow(line, rowSeparator, columnSeparator)
+            if row is None or (numberOfColumns is not None and len(row) != numberOfColumns):
+                print("Cannot cast matrix elements to floats!", file=sys.stderr)
+                return
+            numberOfColumns = len(row)
+            nonzero = np.flatnonzero(row)
+            rows.append(np.full(len(nonzero), numberOfRows, dtype=np.int64))
+            columns.append(nonzero)
+            weights.append(row[nonzero])
+            numberOfRows += 1
+    if numberOfRows == 0:
         print("Cannot cast matrix elements to floats!", file=sys.stderr)
         return
-    A = np.array(lineElements, dtype=float)
-    while True:
-        line = sourceFile.readline()
-        if line == "" or line == "\n":
-            break
-        if line[len(line)-1] == '\n':
-            line = line[:len(line) -1]
-        if line[len(line) - 1] == ' ':
-            line = line[:len(line) - 1]
-        if line[len(line) - 1] == rowSeparator:
-            line = line[:len(line) - 1]
-        if line[len(line) - 1] == ' ':
-            line = line[:len(line) - 1]
-        lineElements = line.split(columnSeparator)
-        try:
-            lineElements = [float(i) for i in lineElements]
-        except ValueError:
-            print("Cannot cast matrix elements to floats!", file=sys.stderr)
-            return
-        # Adds row to existing matrix, assuming same number of elements
-        A = np.vstack([A, lineElements])
-    sourceFile.close()
+    A = scipy.sparse.csr_matrix((np.concatenate(weights), (np.concatenate(rows), np.concatenate(columns))),
+                                shape=(numberOfRows, numberOfColumns))
+    if output == 'sparse':
+        return A
+    if output == 'csr':
+        return CSRGraph.fromSparse(A)
     # Converts matrix into networkX graph object
-    return ntx.from_numpy_array(A)
+    import networkx as ntx
+    return ntx.from_scipy_sparse_array(A)
 
 
 def importEdgeListFile(path, elementSeparator):
     """Reads an edge list file and returns the respective graph
 
+    The file is parsed in bulk by loadEdgeList; blank lines and lines starting with '#' are skipped.
+
     Arguments:
         path -- path of a non-empty file containing an edge list
         elementSeparator -- character seperating the two connected nodes in the edgelist (lines separated by '\n' by default)
     """
 
-    sourceFile = open(path, "r")
-    edgelist = []
-    while True:
-        line = sourceFile.readline()
-        if line == '' or line == '\n':
-            break
-        # Edgelist expects integer values (discrete indices of nodes)
+    return loadEdgeList(path, elementSeparator)
+
+
+def _parseEdges(text, elementSeparator, comments):
+    """Parses a block of edge list lines into an integer array of shape (E, 2), None if it is malformed"""
+
+    if comments and comments in text:
+        text = "\n".join(line for line in text.splitlines() if not line.lstrip().startswith(comments))
+    if elementSeparator and not elementSeparator.isspace():
+        text = text.replace(elementSeparator, ' ')
+    lines = [line for line in text.splitlines() if line.strip()]
+    columns = max(len(lines[0].split()), 2) if lines else 2
+    with warnings.catch_warnings():
+        # numpy warns (instead of raising) when it stops at a token that is not an integer
+        warnings.simplefilter("error", DeprecationWarning)
         try:
-            edgelist.append(tuple([int(i) for i in line.split(elementSeparator)]))
-        except ValueError:
-            print("Cannot cast matrix elements to integers!", file=sys.stderr)
+            values = np.fromstring(text, dtype=np.int64, sep=' ')
+        except (ValueError, DeprecationWarning):
+            return None
+    if len(values) != len(lines) * columns:
+        return None
+    # Further columns (e.g. weights or timestamps) are ignored
+    return values.reshape(-1, columns)[:, :2]
+
+
+def _isDataLine(line, comments):
+    """Returns whether a line of an edge list file holds an edge"""
+
+    stripped = line.strip()
+    return bool(stripped) and not (comments and stripped.startswith(comments))
+
+
+def loadEdgeList(path, elementSeparator=None, comments='#', output='graph', chunkLines=None):
+    """Reads an edge list file in bulk with numpy and returns the respective graph
+
+    Blank lines and comment lines are skipped, further columns after the two node labels are ignored.
+
+    Arguments:
+        path -- path of a file containing an edge list with integer node labels
+        elementSeparator -- character seperating the two connected nodes (default None: any whitespace)
+        comments -- lines starting with this string are skipped (default '#')
+        output -- the type of the returned graph (default 'graph'):
+            'graph' -- a networkX graph object
+            'csr' -- a CSRGraph with nodes numbered in order of first appearance
+        chunkLines -- when given, the file is streamed in chunks of this many lines into a preallocated
+            edge array (counted in a first pass), so the peak memory stays close to the final edge array
+            instead of holding the whole text (default None: the file is read at once)
+    """
+
+    if chunkLines is None:
+        with open(path, "r") as sourceFile:
+            edges = _parseEdges(sourceFile.read(), elementSeparator, comments)
+    else:
+        with open(path, "r") as sourceFile:
+            numberOfEdges = sum(1 for line in sourceFile if _isDataLine(line, comments))
+        edges = np.empty((numberOfEdges, 2), dtype=np.int64)
+        filled = 0
+        with open(path, "r") as sourceFile:
+            while True:
+                rawLines = list(islice(sourceFile, chunkLines))
+                if not rawLines:
+                    break
+                chunk = [line for line in rawLines if _isDataLine(line, comments)]
+                if not chunk:
+                    continue
+                chunkEdges = _parseEdges("".join(chunk), elementSeparator, None)
+                if chunkEdges is None or filled + len(chunkEdges) > numberOfEdges:
+                    edges = None
+                    break
+                edges[filled:filled + len(chunkEdges)] = chunkEdges
+                filled += len(chunkEdges)
+    if edges is None:
+        print("Cannot cast edge list elements to integers!", file=sys.stderr)
+        return
+    if output == 'csr':
+        return CSRGraph.fromLabelledEdges(edges)
+    # Converts edgelist to networkx graph object
+    import networkx as ntx
+    return ntx.from_edgelist(edges.tolist())
+
+
+def _fileChecksum(path):
+    """Returns the SHA-1 hex digest of a file's content"""
+
+    digest = hashlib.sha1()
+    with open(path, "rb") as sourceFile:
+        for block in iter(lambda: sourceFile.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _loadSidecar(path, sidecar):
+    """Returns the memory-mapped CSRGraph of a valid sidecar belonging to path, otherwise None"""
+
+    metaPath = os.path.join(sidecar, 'meta.json')
+    try:
+        with open(metaPath, "r") as metaFile:
+            meta = json.load(metaFile)
+        status = os.stat(path)
+        if meta['size'] != status.st_size:
+            return None
+        if meta['mtime_ns'] != status.st_mtime_ns:
+            # touched but possibly unchanged: the content checksum decides
+            if meta['sha1'] != _fileChecksum(path):
+                return None
+            meta['mtime_ns'] = status.st_mtime_ns
+            _writeJson(metaPath, meta)
+        return CSRGraph.load(sidecar)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _writeJson(path, content):
+    """Writes a JSON file atomically, through a temporary file unique to the process"""
+
+    with open(path + '.%d.tmp' % os.getpid(), "w") as jsonFile:
+        json.dump(content, jsonFile)
+    os.replace(path + '.%d.tmp' % os.getpid(), path)
+
+
+def _writeSidecar(H, path, sidecar):
+    """Writes the binary sidecar of a graph loaded from path, the meta file is written last"""
+
+    status = os.stat(path)
+    metaPath = os.path.join(sidecar, 'meta.json')
+    if os.path.exists(metaPath):
+        os.remove(metaPath)
+    H.save(sidecar)
+    _writeJson(metaPath, {'size': status.st_size, 'mtime_ns': status.st_mtime_ns, 'sha1': _fileChecksum(path)})
+
+
+def csrToGraph(H):
+    """Returns the networkX graph belonging to a CSRGraph (same node order, weights as 'weight' edge attributes)
+
+    Arguments:
+        H -- a CSRGraph
+    """
+
+    import networkx as ntx
+    G = ntx.Graph()
+    G.add_nodes_from(H.nodes)
+    upper = H.sources <= H.indices
+    labels = np.asarray(H.nodes)
+    edges = zip(labels[H.sources[upper]].tolist(), labels[H.indices[upper]].tolist())
+    if H.weights is None:
+        G.add_edges_from(edges)
+    else:
+        G.add_weighted_edges_from((u, v, w) for (u, v), w in zip(edges, H.weights[upper].tolist()))
+    return G
+
+
+def loadGraph(path, elementSeparator=None, output='graph', cache=True):
+    """Loads an edge list file, parsing the text only once and memory-mapping a binary cache afterwards
+
+    On the first load a sidecar directory path + '.csr' is written next to the file, holding the CSR arrays,
+    the original node labels (the map from contiguous index to label) and a checksum of the text file.
+    Later loads memory-map the sidecar as long as the text file is unchanged. A memory-mapped CSRGraph
+    sent to worker processes (e.g. through replicate_pool) is reopened from the sidecar instead of copied.
+
+    Arguments:
+        path -- path of a file containing an edge list with integer node labels
+        elementSeparator -- character seperating the two connected nodes (default None: any whitespace)
+        output -- the type of the returned graph (default 'graph'):
+            'graph' -- a networkX graph object
+            'csr' -- a memory-mapped CSRGraph
+        cache -- when False, the sidecar is neither read nor written (default True)
+    """
+
+    sidecar = path + '.csr'
+    H = _loadSidecar(path, sidecar) if cache else None
+    if H is None:
+        H = loadEdgeList(path, elementSeparator, output='csr')
+        if H is None:
             return
-    sourceFile.close()
-    #Converts edgelist to networkx graph object
-    return ntx.from_edgelist(edgelist)
+        if cache:
+            try:
+                _writeSidecar(H, path, sidecar)
+                H = CSRGraph.load(sidecar)
+            except OSError:
+                print("Cannot write graph cache " + sidecar, file=sys.stderr)
+    return H if output == 'csr' else csrToGraph(H)
@@ -6,16 +6,16 @@ Threshold Conditions for Arbitrary Cascade Models on Arbitrary Networks. Knowled
 """
 
 from sirFunctions import fig_5_left, fig_5_right, fig_5_right_initial
-from fetchData import importEdgeListFile
+from fetchData import loadGraph
 from calculateLambda import obtainMaxEig
 from centrality import crucialNodesEigenvector
 
 
 # Data sources (for details see data/readme.md) ########################################################################
 
-E = importEdgeListFile("data/as-oregon/as20000102.txt", '\t') # used for reproduction of the paper
-#E = importEdgeListFile("data/facebook_ego.txt", ' ')  # used for validation of the paper
-#E = importEdgeListFile('data/terrorist.txt', '\t')  # used to challenge the model with a small network
+E = loadGraph("data/as-oregon/as20000102.txt", '\t') # used for reproduction of the paper
+#E = loadGraph("data/facebook_ego.txt", ' ')  # used for validation of the paper
+#E = loadGraph('data/terrorist.txt', '\t')  # used to challenge the model with a small network
 
 
 # Simulation parameters ################################################################################################
@@ -24,6 +24,8 @@ initial_size = 0  # number of initially infected nodes
 initial_sizes = []  # different initial sizes for fig_5_right_initial
 iterations = 0  # number of independent simulation runs (overall results are average) for all three functions
 number_of_steps = 0  # number of different s-values in fig_5_right and fig_5_right_initial
+seed = 0  # makes the results reproducible and lets reruns load them from the store
+store = 'results'  # directory of the results store, finished points are only computed once
 
 
 # Reproduction of SIR figures from the paper (page 13) #################################################################
@@ -40,14 +42,14 @@ print("Largest Eigenvalue of the Adjacency Matrix = " + str(round(eig, 2)))
 beta = [0.1/eig, 0.5/eig, 20/eig, 100/eig]  # Defining the different s values (as s = eig*beta/delta)
 delta = [1, 1, 1, 1]
 
-fig_5_left(E, initial_size, 10*iterations, beta=beta, delta=delta)
-fig_5_right(E, initial_size, iterations, number_of_steps)
+fig_5_left(E, initial_size, 10*iterations, beta=beta, delta=delta, seed=seed, store=store)
+fig_5_right(E, initial_size, iterations, number_of_steps, seed=seed, store=store)
 
 
 # Investigating the influence of the number of initial nodes ###########################################################
 
 initial_sizes = [10, 100, 1000]
-fig_5_right_initial(E, initial_sizes, iterations, number_of_steps)
+fig_5_right_initial(E, initial_sizes, iterations, number_of_steps, seed=seed, store=store)
 
 
 # Investigating the influence of infecting the nodes with the highest eigenvector centrality ###########################
@@ -55,8 +57,8 @@ fig_5_right_initial(E, initial_sizes, iterations, number_of_steps)
 initial_nodes = crucialNodesEigenvector(E, number_of_nodes=initial_size)
 print("Nodes with highest betweenness: " + str(initial_nodes))
 
-fig_5_right(E, initial_size, iterations, number_of_steps, show=False)
-fig_5_right(E, initial_size, iterations, number_of_steps, initial_nodes=initial_nodes)
+fig_5_right(E, initial_size, iterations, number_of_steps, show=False, seed=seed, store=store)
+fig_5_right(E, initial_size, iterations, number_of_steps, initial_nodes=initial_nodes, seed=seed, store=store)
 
 initial_nodes_array = list()
 for i in range(0, len(initial_sizes)):
@@ -65,19 +67,19 @@ for i in range(0, len(initial_sizes)):
 
 # Combining infection of critical nodes with different number of initial nodes #########################################
 
-fig_5_right_initial(E, initial_sizes, iterations, number_of_steps, initial_nodes=initial_nodes_array)
+fig_5_right_initial(E, initial_sizes, iterations, number_of_steps, initial_nodes=initial_nodes_array, seed=seed, store=store)
 
 
 # Time behaviour when nodes with highest centrality are infected #######################################################
 
 beta = [0.5/eig, 0.8/eig, 3/eig, 10/eig]
-fig_5_left(E, initial_size, 10*iterations, initial_nodes=initial_nodes, beta=beta, delta=delta)
+fig_5_left(E, initial_size, 10*iterations, initial_nodes=initial_nodes, beta=beta, delta=delta, seed=seed, store=store)
 
 
 # Validation of the paper using a different graph ######################################################################
 
 print("Data set FACEBOOK-EGO")
-E = importEdgeListFile("data/facebook_ego.txt", ' ')
+E = loadGraph("data/facebook_ego.txt", ' ')
 
 eig = obtainMaxEig(E)
 print("\n" + str(len(E.nodes)) + " nodes")
@@ -87,20 +89,20 @@ initial_nodes = crucialNodesEigenvector(E, number_of_nodes=initial_size)
 print("Nodes with highest betweenness: " + str(initial_nodes))
 
 
-fig_5_right(E, initial_size, iterations, number_of_steps, show=False)
-fig_5_right(E, initial_size, iterations, number_of_steps, initial_nodes=initial_nodes)
+fig_5_right(E, initial_size, iterations, number_of_steps, show=False, seed=seed, store=store)
+fig_5_right(E, initial_size, iterations, number_of_steps, initial_nodes=initial_nodes, seed=seed, store=store)
 
 initial_nodes_array = list()
 for i in range(0, len(initial_sizes)):
     initial_nodes_array.append(crucialNodesEigenvector(E, number_of_nodes=initial_sizes[i]))
 
-fig_5_right_initial(E, initial_sizes, iterations, number_of_steps, initial_nodes=initial_nodes_array)
+fig_5_right_initial(E, initial_sizes, iterations, number_of_steps, initial_nodes=initial_nodes_array, seed=seed, store=store)
 
 
 # Challenging the model using a small network ##########################################################################
 
 print("Data set TERRORISTS")
-E = importEdgeListFile('data/terrorist.txt', '\t')
+E = loadGraph('data/terrorist.txt', '\t')
 
 eig = obtainMaxEig(E)
 print("\n" + str(len(E.nodes)) + " nodes")
@@ -112,4 +114,4 @@ initial_nodes_array = list()
 for i in range(0, len(initial_sizes)):
     initial_nodes_array.append(crucialNodesEigenvector(E, number_of_nodes=initial_sizes[i]))
 
-fig_5_right_initial(E, initial_sizes, 5*iterations, number_of_steps, initial_nodes=initial_nodes_array)
+fig_5_right_initial(E, initial_sizes, 5*iterations, number_of_steps, initial_nodes=initial_nodes_array, seed=seed, store=store)
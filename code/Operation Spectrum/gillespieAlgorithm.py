@@ -29,9 +29,18 @@ SOFTWARE.
 """
 
 
+import heapq
 import random
+from array import array
+import time
 import scipy
+import numpy as np
 from collections import defaultdict  # container data type
+from itertools import chain
+from csrGraph import CSRGraph
+
+# Largest number of random numbers a _RandomStream_ draws from its generator at once
+RANDOM_BLOCK = 4096
 
 
 class _ListDict_(object):  # defines data type
@@ -58,11 +67,13 @@ class _ListDict_(object):  # defines data type
             self.items[position] = last_item
             self.item_to_position[last_item] = position
             
-    def choose_random(self):
-        return random.choice(self.items)
+    def choose_random(self, u=None):
+        if u is None:
+            return random.choice(self.items)
+        return self.items[int(u*len(self.items))]
         
-    def random_removal(self):
-        choice = self.choose_random()
+    def random_removal(self, u=None):
+        choice = self.choose_random(u)
         self.remove(choice)
         return choice
 
@@ -70,7 +81,167 @@ class _ListDict_(object):  # defines data type
         return len(self)
 
 
-def Gillespie_SIR(G, tau, gamma, initial_infecteds=None, tmin = 0, tmax=float('Inf')):
+class _SumTree_(object):
+    """Binary tree of partial sums over a fixed number of non-negative item weights,
+    to draw an item with probability proportional to its weight and to change
+    a weight, both in O(log n)"""
+
+    def __init__(self, size):
+        self.leaves = 1
+        while self.leaves < size:
+            self.leaves *= 2
+        self.tree = array('d', [0.0])*(2*self.leaves)  # node i has the children 2i and 2i+1, the root is 1
+        self.view = np.frombuffer(self.tree, dtype=float)
+        self.children = self.view.reshape(-1, 2)  # row i holds the children of node i
+
+    def total_weight(self):
+        return self.tree[1]
+
+    def update(self, item, weight):
+        tree = self.tree
+        i = item + self.leaves
+        tree[i] = weight
+        i >>= 1
+        while i:
+            # sums are recomputed from the children, so no rounding errors accumulate
+            tree[i] = tree[2*i] + tree[2*i+1]
+            i >>= 1
+
+    def update_many(self, items, weights):
+        """Sets the weights of an array of items, one tree level at a time
+
+        The items are sorted first unless they already are, a repeated item gets its last weight."""
+
+        if not len(items):
+            return
+        view, children = self.view, self.children
+        i = np.asarray(items, dtype=np.int64) + self.leaves
+        if len(i) > 1 and not (i[1:] > i[:-1]).all():
+            weights = np.broadcast_to(np.asarray(weights, dtype=float), i.shape)
+            order = np.argsort(i, kind='stable')
+            i, weights = i[order], weights[order]
+            last = np.append(i[1:] != i[:-1], True)
+            i, weights = i[last], weights[last]
+        view[i] = weights
+        low, high = int(i[0]), int(i[-1])
+        while low > 1:
+            if high - low > 32*len(i):
+                # scattered items, only their ancestors are recomputed
+                i >>= 1
+                i = i[np.concatenate(([True], i[1:] != i[:-1]))]
+                view[i] = children[i].sum(axis=1)
+                low, high = int(i[0]), int(i[-1])
+            else:
+                # the whole range of nodes between the ancestors is recomputed
+                low >>= 1
+                high >>= 1
+                np.add(children[low:high+1, 0], children[low:high+1, 1], out=view[low:high+1])
+
+    def choose_random(self, u=None):
+        """Draws an item, u is a uniform random number on [0, 1) (default: one from the random module)"""
+
+        tree = self.tree
+        u = (random.random() if u is None else u)*tree[1]
+        i = 1
+        while i < self.leaves:
+            i *= 2
+            # a zero right subtree is never entered, even if rounding pushed u past the left sum
+            if u >= tree[i] and tree[i+1] > 0:
+                u -= tree[i]
+                i += 1
+        return i - self.leaves
+
+
+class _RandomStream_(object):
+    """Uniform and exponential random numbers of a numpy Generator, drawn in blocks
+
+    random() returns the next uniform number on [0, 1), exponential() the next
+    exponential one with rate 1 (divide it by the rate). Both iterate over
+    lists of pregenerated numbers in C and only call the generator to refill
+    them, which is cheaper per number than the random module. The blocks
+    start small and double up to RANDOM_BLOCK numbers, so short simulations
+    do not pay for numbers they never use.
+
+    Arguments:
+        seed -- seed or numpy Generator, None for a generator seeded from the random module
+            (so random.seed makes the numbers reproducible)
+    """
+
+    def __init__(self, seed=None):
+        self.generator = np.random.default_rng(random.getrandbits(64) if seed is None else seed)
+        self.random = chain.from_iterable(self._blocks(self.generator.random)).__next__
+        self.exponential = chain.from_iterable(self._blocks(self.generator.standard_exponential)).__next__
+
+    @staticmethod
+    def _blocks(draw):
+        size = 64
+        while True:
+            yield draw(size).tolist()
+            size = min(2*size, RANDOM_BLOCK)
+
+
+class _Recorder_(object):
+    """Collects the S, I, R counts of a simulation, either after every event,
+    only at given report times or only the final state"""
+
+    def __init__(self, tmin, S, I, R, report_times=None, final_only=False):
+        self.last = (tmin, S, I, R)
+        if final_only:
+            self.record = self._keep_last
+        elif report_times is not None:
+            self.report_times = list(report_times)
+            self.reports = []
+            self.record = self._report
+        else:
+            self.times, self.S, self.I, self.R = [tmin], [S], [I], [R]
+            self.record = self._append
+
+    def _keep_last(self, t, S, I, R):
+        self.last = (t, S, I, R)
+
+    def _append(self, t, S, I, R):
+        self.times.append(t)
+        self.S.append(S)
+        self.I.append(I)
+        self.R.append(R)
+
+    def _report(self, t, S, I, R):
+        # the state before this event holds for all report times earlier than t
+        while len(self.reports) < len(self.report_times) and self.report_times[len(self.reports)] < t:
+            self.reports.append(self.last)
+        self.last = (t, S, I, R)
+
+    def result(self):
+        """Returns times, S, I, R as numpy arrays"""
+
+        if self.record == self._append:
+            return np.array(self.times), np.array(self.S), np.array(self.I), np.array(self.R)
+        if self.record == self._report:
+            reports = self.reports + [self.last] * (len(self.report_times) - len(self.reports))
+            _, S, I, R = zip(*reports) if reports else ((), (), (), ())
+            return np.array(self.report_times), np.array(S), np.array(I), np.array(R)
+        return tuple(np.array([value]) for value in self.last)
+
+
+def _record_stats(stats, transmissions, recoveries, scanned, started, events_started, events_finished):
+    """Adds the counts and phase times of a finished simulation to a SimulationStats object"""
+
+    stats.simulations += 1
+    stats.transmissions += transmissions
+    stats.recoveries += recoveries
+    stats.events += transmissions + recoveries
+    stats.neighbours += scanned
+    stats.add_time('setup', events_started - started)
+    stats.add_time('events', events_finished - events_started)
+    stats.add_time('output', time.perf_counter() - events_finished)
+
+
+# Degree from which the CSR engines scan a neighbourhood with numpy instead of a Python loop
+_NUMPY_DEGREE = 32
+
+
+def Gillespie_SIR(G, tau, gamma, initial_infecteds=None, tmin = 0, tmax=float('Inf'), report_times=None,
+                  final_only=False, stats=None, transmission_weight=None, recovery_weight=None, seed=None):
     """
     Performs SIR simulations for epidemics.
     
@@ -92,18 +263,53 @@ def Gillespie_SIR(G, tau, gamma, initial_infecteds=None, tmin = 0, tmax=float('I
             
     **tmax** number (default Infinity)
         stop time
+
+    **report_times** iterable (ordered, optional)
+        when given, S, I and R are only recorded at these times while
+        the simulation runs, as subsample would return them
+
+    **final_only** boolean (default False)
+        when True, only the state after the last event before tmax
+        is recorded
+
+    **stats** SimulationStats (optional)
+        when given, event counts, container sizes and phase times
+        of this simulation are added to it
+
+    **transmission_weight** string (optional)
+        edge attribute of G holding edge weights; an edge transmits
+        at rate tau*weight (default 1 for edges without the attribute)
+
+    **recovery_weight** string or dict (optional)
+        node attribute of G (or dict from nodes) holding node weights;
+        a node recovers at rate gamma*weight (default 1)
+
+    **seed** integer or numpy Generator (optional)
+        source of all random numbers of the simulation; by default a
+        generator seeded from the random module, so random.seed makes
+        the results reproducible
+
+    Weighted simulations are run by Gillespie_SIR_CSR.
         
     :Returns: 
         
     **times, S, I, R** each a scipy array
         giving times and number in each status for corresponding time
+        (report_times if given, a single entry if final_only)
     """
 
+    if transmission_weight is not None or recovery_weight is not None:
+        return Gillespie_SIR_CSR(G, tau, gamma, initial_infecteds, tmin, tmax, report_times, final_only, stats,
+                                 transmission_weight, recovery_weight, seed)
 
-    I = [len(initial_infecteds)]
-    R = [0]
-    S = [G.order()-I[0]]
-    times = [tmin]
+    stream = _RandomStream_(seed)
+    uniform, exponential = stream.random, stream.exponential
+    started = time.perf_counter()
+    I = len(initial_infecteds)
+    R = 0
+    S = G.order()-I
+    recorder = _Recorder_(tmin, S, I, R, report_times, final_only)
+    record = recorder.record
     
     t = tmin
     
@@ -127,23 +333,26 @@ def Gillespie_SIR(G, tau, gamma, initial_infecteds=None, tmin = 0, tmax=float('I
     total_transmission_rate = tau*IS_links.total_weight()
         
     total_rate = total_recovery_rate + total_transmission_rate
-    delay = random.expovariate(total_rate)
+    delay = exponential()/total_rate
     t += delay
+    S_initial = S
+    if stats is not None:
+        stats.sample(len(infecteds), len(IS_links), len(IS_links))
+    events_started = time.perf_counter()
     
     while infecteds and t<tmax:
-        if random.random()<total_recovery_rate/total_rate: #recover
-            recovering_node = infecteds.random_removal()
+        if uniform()<total_recovery_rate/total_rate: #recover
+            recovering_node = infecteds.random_removal(uniform())
             status[recovering_node]='R'
 
             for nbr in G.neighbors(recovering_node):
                 if status[nbr] == 'S':
                     IS_links.remove((recovering_node, nbr))
-            times.append(t)
-            S.append(S[-1])
-            I.append(I[-1]-1)
-            R.append(R[-1]+1)
+            I -= 1
+            R += 1
+            record(t, S, I, R)
         else: #transmit
-            transmitter, recipient = IS_links.choose_random()
+            transmitter, recipient = IS_links.choose_random(uniform())
             status[recipient]='I'
 
             infecteds.add(recipient)
@@ -154,22 +363,981 @@ def Gillespie_SIR(G, tau, gamma, initial_infecteds=None, tmin = 0, tmax=float('I
                 elif status[nbr] == 'I' and nbr != recipient:
                     IS_links.remove((nbr, recipient))
                      
-            times.append(t)
-            S.append(S[-1]-1)
-            I.append(I[-1]+1)
-            R.append(R[-1])
+            S -= 1
+            I += 1
+            record(t, S, I, R)
             
         total_recovery_rate = gamma*len(infecteds) #.total_weight()
         total_transmission_rate = tau*IS_links.total_weight()
+        if stats is not None:
+            stats.sample(len(infecteds), len(IS_links), len(IS_links))
+
+        total_rate = total_recovery_rate + total_transmission_rate
+        if total_rate>0:
+            delay = exponential()/total_rate
+        else:
+            delay = float('Inf')
+        t += delay
+
+    events_finished = time.perf_counter()
+    result = recorder.result()
+    if stats is not None:
+        # every node scans its neighbours when it gets infected and again when it recovers
+        scanned = sum(G.degree(node) * (1 if node_status == 'I' else 2)
+                      for node, node_status in status.items() if node_status != 'S')
+        _record_stats(stats, S_initial - S, R, scanned, started, events_started, events_finished)
+    return result
+
+
+def Gillespie_SIR_CSR(G, tau, gamma, initial_infecteds=None, tmin = 0, tmax=float('Inf'), report_times=None,
+                      final_only=False, stats=None, transmission_weight=None, recovery_weight=None, seed=None):
+    """
+    Performs SIR simulations for epidemics on a CSR adjacency.
+
+    Same model and return values as Gillespie_SIR, but the nodes are
+    relabelled to 0..N-1 once and neighbours are read from the indptr/indices
+    arrays. The status is kept in a byte array (0 = S, 1 = I, 2 = R) and an
+    I-S link is stored as the integer CSR position of the directed edge.
+
+    Links are never removed one by one: the number of valid I-S links is
+    counted exactly, links that became invalid stay in the list until they
+    are drawn (and rejected) or until the list is compacted. Neighbourhoods
+    of high degree nodes are scanned with numpy.
+
+    Weighted graphs and node recovery weights are simulated by drawing the
+    events from sum trees (see _Gillespie_SIR_weighted), unweighted ones
+    as described above.
+
+    :Arguments:
+
+    **G** networkx Graph or CSRGraph
+        The underlying network (pass a CSRGraph to convert only once
+        for many simulations)
+
+    **tau** positive float
+        transmission rate per edge
+
+    **gamma** number
+        recovery rate per node
+
+    **initial_infecteds** node or iterable of nodes
+        original node labels of the initially infected nodes
+
+    **tmin** number (default 0)
+        starting time
+
+    **tmax** number (default Infinity)
+        stop time
+
+    **report_times** iterable (ordered, optional)
+        when given, S, I and R are only recorded at these times
+
+    **final_only** boolean (default False)
+        when True, only the state after the last event before tmax
+        is recorded
+
+    **stats** SimulationStats (optional)
+        when given, event counts, container sizes and phase times
+        of this simulation are added to it
+
+    **transmission_weight** string (optional)
+        edge attribute holding the edge weights if G is a networkx Graph;
+        an edge transmits at rate tau*weight. A CSRGraph carries its
+        weights (G.weights) itself, they are always used.
+
+    **recovery_weight** string or dict (optional)
+        node attribute (networkx Graph) or dict from node labels holding
+        node weights; a node recovers at rate gamma*weight (default 1)
+
+    **seed** integer or numpy Generator (optional)
+        source of all random numbers of the simulation; by default a
+        generator seeded from the random module, so random.seed makes
+        the results reproducible
+
+    :Returns:
+
+    **times, S, I, R** each a numpy array
+        giving times and number in each status for corresponding time
+        (report_times if given, a single entry if final_only)
+    """
+
+    if not isinstance(G, CSRGraph):
+        if isinstance(recovery_weight, str):
+            recovery_weight = {node: weight for node, weight in G.nodes(data=recovery_weight) if weight is not None}
+        G = CSRGraph.fromGraph(G, weight=transmission_weight)
+    if G.weights is not None or recovery_weight is not None:
+        return _Gillespie_SIR_weighted(G, tau, gamma, initial_infecteds, tmin, tmax, report_times, final_only, stats,
+                                       recovery_weight, seed)
+    stream = _RandomStream_(seed)
+    uniform, exponential = stream.random, stream.exponential
+    indptr, indices, sources, self_loops = G.adjacencyLists()
+    neighbours = G.indices
+    initial_infecteds = np.unique(G.toIndices(initial_infecteds)).astype(np.int64).tolist()  # duplicates count once
+
+    started = time.perf_counter()
+    I = len(initial_infecteds)
+    R = 0
+    S = len(G)-I
+    recorder = _Recorder_(tmin, S, I, R, report_times, final_only)
+    record = recorder.record
+
+    t = tmin
+
+    status = bytearray(len(G))  # 0 = S, 1 = I, 2 = R
+    status_view = np.frombuffer(status, dtype=np.uint8)
+
+    for node in initial_infecteds:
+        status[node] = 1
+
+    infecteds = list(initial_infecteds)
+
+    # I-S links as CSR positions in a preallocated typed array, the first IS_size entries are used.
+    # A position is only stored when its source node gets infected, so every one is stored at most once.
+    IS_links = array('q', [0])*len(indices)
+    links_view = np.frombuffer(IS_links, dtype=np.int64)
+    IS_size = 0  # may include links that are no longer I-S
+    IS_count = 0  # number of valid I-S links
+
+    for node in infecteds:
+        new_links = indptr[node] + np.flatnonzero(status_view[neighbours[indptr[node]:indptr[node+1]]] == 0)
+        links_view[IS_size:IS_size+len(new_links)] = new_links
+        IS_size += len(new_links)
+        IS_count += len(new_links)
+
+    total_recovery_rate = gamma*len(infecteds)
+
+    total_transmission_rate = tau*IS_count
+
+    total_rate = total_recovery_rate + total_transmission_rate
+    delay = exponential()/total_rate
+    t += delay
+    S_initial = S
+    if stats is not None:
+        stats.sample(len(infecteds), IS_count, IS_size)
+    events_started = time.perf_counter()
+
+    while infecteds and t<tmax:
+        if uniform()<total_recovery_rate/total_rate: #recover
+            position = int(uniform()*len(infecteds))
+            recovering_node = infecteds[position]
+            infecteds[position] = infecteds[-1]
+            infecteds.pop()
+            status[recovering_node] = 2
+
+            start, stop = indptr[recovering_node], indptr[recovering_node+1]
+            if stop - start < _NUMPY_DEGREE:
+                for position in range(start, stop):
+                    if status[indices[position]] == 0:
+                        IS_count -= 1
+            else:
+                IS_count -= int(np.count_nonzero(status_view[neighbours[start:stop]] == 0))
+            I -= 1
+            R += 1
+            record(t, S, I, R)
+        else: #transmit
+            while True:
+                link = int(uniform()*IS_size)
+                position = IS_links[link]
+                recipient = indices[position]
+                if status[recipient] == 0 and status[sources[position]] == 1:
+                    break
+                # drop the invalid link
+                IS_size -= 1
+                IS_links[link] = IS_links[IS_size]
+                if stats is not None:
+                    stats.rejected += 1
+            status[recipient] = 1
+
+            infecteds.append(recipient)
+
+            # the recipient is now infected itself, a self-loop must not count as I neighbour
+            IS_count += self_loops[recipient]
+            start, stop = indptr[recipient], indptr[recipient+1]
+            if stop - start < _NUMPY_DEGREE:
+                for position in range(start, stop):
+                    nbr_status = status[indices[position]]
+                    if nbr_status == 0:
+                        IS_links[IS_size] = position
+                        IS_size += 1
+                        IS_count += 1
+                    elif nbr_status == 1:
+                        IS_count -= 1
+            else:
+                nbr_status = status_view[neighbours[start:stop]]
+                new_links = np.flatnonzero(nbr_status == 0)
+                links_view[IS_size:IS_size+len(new_links)] = start + new_links
+                IS_size += len(new_links)
+                IS_count += len(new_links) - int(np.count_nonzero(nbr_status == 1))
+
+            if IS_size > 2*IS_count + _NUMPY_DEGREE:
+                # compaction in place
+                stored = links_view[:IS_size]
+                valid = stored[(status_view[G.indices[stored]] == 0) & (status_view[G.sources[stored]] == 1)]
+                links_view[:len(valid)] = valid
+                IS_size = len(valid)
+
+            S -= 1
+            I += 1
+            record(t, S, I, R)
+
+        total_recovery_rate = gamma*len(infecteds)
+        total_transmission_rate = tau*IS_count
+        if stats is not None:
+            stats.sample(len(infecteds), IS_count, IS_size)
 
         total_rate = total_recovery_rate + total_transmission_rate
         if total_rate>0:
-            delay = random.expovariate(total_rate)
+            delay = exponential()/total_rate
         else:
             delay = float('Inf')
         t += delay
 
-    return scipy.array(times), scipy.array(S), scipy.array(I), scipy.array(R)
+    events_finished = time.perf_counter()
+    result = recorder.result()
+    if stats is not None:
+        # every node scans its neighbours when it gets infected and again when it recovers
+        degrees = G.degrees()
+        scanned = int(degrees[status_view != 0].sum() + degrees[status_view == 2].sum())
+        _record_stats(stats, S_initial - S, R, scanned, started, events_started, events_finished)
+    return result
+
+
+def _Gillespie_SIR_weighted(G, tau, gamma, initial_infecteds, tmin, tmax, report_times, final_only, stats,
+                            recovery_weight, seed):
+    """
+    Performs SIR simulations on a weighted CSRGraph and/or with node
+    recovery weights, see Gillespie_SIR_CSR for the arguments.
+
+    Instead of I-S links, every susceptible node keeps its infection
+    pressure, the summed weight of its edges to infected nodes, and its
+    number of infected neighbours (the pressure is reset to exactly 0
+    when that number drops to 0). The pressures and the recovery weights
+    of the infected nodes are the leaves of two sum trees, so drawing the
+    next event and updating a neighbour take O(log N).
+    """
+
+    N = len(G)
+    indptr, indices, sources, self_loops = G.adjacencyLists()
+    neighbours = G.indices
+    edge_weights = np.ones(len(neighbours)) if G.weights is None else np.asarray(G.weights, dtype=float)
+    weights = array('d', edge_weights.tobytes())
+    recovery_weights = np.ones(N)
+    if recovery_weight is not None:
+        for node, weight in recovery_weight.items():
+            recovery_weights[G.index[node]] = weight
+    node_weights = array('d', recovery_weights.tobytes())
+    stream = _RandomStream_(seed)
+    uniform, exponential = stream.random, stream.exponential
+    initial_infecteds = np.unique(G.toIndices(initial_infecteds)).astype(np.int64).tolist()  # duplicates count once
+
+    started = time.perf_counter()
+    I = len(initial_infecteds)
+    R = 0
+    S = N-I
+    recorder = _Recorder_(tmin, S, I, R, report_times, final_only)
+    record = recorder.record
+
+    t = tmin
+
+    status = bytearray(N)  # 0 = S, 1 = I, 2 = R
+    status_view = np.frombuffer(status, dtype=np.uint8)
+    pressure = array('d', [0.0])*N
+    pressure_view = np.frombuffer(pressure, dtype=float)
+    infected_nbrs = array('q', [0])*N
+    infected_nbrs_view = np.frombuffer(infected_nbrs, dtype=np.int64)
+    transmissions = _SumTree_(N)  # leaves: pressure of the susceptible nodes
+    recoveries = _SumTree_(N)  # leaves: recovery weight of the infected nodes
+
+    for node in initial_infecteds:
+        status[node] = 1
+    initial = np.array(initial_infecteds, dtype=np.int64)
+    recoveries.update_many(initial, recovery_weights[initial])
+    for node in initial_infecteds:
+        nbrs = neighbours[indptr[node]:indptr[node+1]]
+        susceptible = status_view[nbrs] == 0
+        pressure_view[nbrs[susceptible]] += edge_weights[indptr[node]:indptr[node+1]][susceptible]
+        infected_nbrs_view[nbrs[susceptible]] += 1
+    exposed = np.flatnonzero(infected_nbrs_view)
+    transmissions.update_many(exposed, pressure_view[exposed])
+    IS_count = int(infected_nbrs_view.sum())  # number of I-S links
+
+    total_recovery_rate = gamma*recoveries.total_weight()
+    total_transmission_rate = tau*transmissions.total_weight()
+
+    total_rate = total_recovery_rate + total_transmission_rate
+    delay = exponential()/total_rate if total_rate > 0 else float('Inf')
+    t += delay
+    S_initial = S
+    if stats is not None:
+        stats.sample(I, IS_count, IS_count)
+    events_started = time.perf_counter()
+
+    while I and t<tmax:
+        if uniform()<total_recovery_rate/total_rate: #recover
+            recovering_node = recoveries.choose_random(uniform())
+            recoveries.update(recovering_node, 0.0)
+            status[recovering_node] = 2
+
+            start, stop = indptr[recovering_node], indptr[recovering_node+1]
+            if stop - start < _NUMPY_DEGREE:
+                for position in range(start, stop):
+                    nbr = indices[position]
+                    if status[nbr] == 0:
+                        count = infected_nbrs[nbr] - 1
+                        infected_nbrs[nbr] = count
+                        nbr_pressure = pressure[nbr] - weights[position] if count else 0.0
+                        pressure[nbr] = nbr_pressure
+                        transmissions.update(nbr, nbr_pressure)
+                        IS_count -= 1
+            else:
+                nbrs = neighbours[start:stop]
+                susceptible = status_view[nbrs] == 0
+                nbrs = nbrs[susceptible]
+                infected_nbrs_view[nbrs] -= 1
+                pressure_view[nbrs] -= edge_weights[start:stop][susceptible]
+                pressure_view[nbrs[infected_nbrs_view[nbrs] == 0]] = 0.0
+                transmissions.update_many(nbrs, pressure_view[nbrs])
+                IS_count -= len(nbrs)
+            I -= 1
+            R += 1
+            record(t, S, I, R)
+        else: #transmit
+            recipient = transmissions.choose_random(uniform())
+            transmissions.update(recipient, 0.0)
+            status[recipient] = 1
+            pressure[recipient] = 0.0
+            IS_count -= infected_nbrs[recipient]
+            recoveries.update(recipient, node_weights[recipient])
+
+            start, stop = indptr[recipient], indptr[recipient+1]
+            if stop - start < _NUMPY_DEGREE:
+                for position in range(start, stop):
+                    nbr = indices[position]
+                    if status[nbr] == 0:
+                        infected_nbrs[nbr] += 1
+                        nbr_pressure = pressure[nbr] + weights[position]
+                        pressure[nbr] = nbr_pressure
+                        transmissions.update(nbr, nbr_pressure)
+                        IS_count += 1
+            else:
+                nbrs = neighbours[start:stop]
+                susceptible = status_view[nbrs] == 0
+                nbrs = nbrs[susceptible]
+                infected_nbrs_view[nbrs] += 1
+                pressure_view[nbrs] += edge_weights[start:stop][susceptible]
+                transmissions.update_many(nbrs, pressure_view[nbrs])
+                IS_count += len(nbrs)
+            S -= 1
+            I += 1
+            record(t, S, I, R)
+
+        total_recovery_rate = gamma*recoveries.total_weight()
+        total_transmission_rate = tau*transmissions.total_weight()
+        if stats is not None:
+            stats.sample(I, IS_count, IS_count)
+
+        total_rate = total_recovery_rate + total_transmission_rate
+        if total_rate>0:
+            delay = exponential()/total_rate
+        else:
+            delay = float('Inf')
+        t += delay
+
+    events_finished = time.perf_counter()
+    result = recorder.result()
+    if stats is not None:
+        # every node scans its neighbours when it gets infected and again when it recovers
+        degrees = G.degrees()
+        scanned = int(degrees[status_view != 0].sum() + degrees[status_view == 2].sum())
+        _record_stats(stats, S_initial - S, R, scanned, started, events_started, events_finished)
+    return result
+
+
+def Gillespie_SIR_temporal(series, tau, gamma, initial_infecteds=None, snapshot_times=(), tmin = 0,
+                           tmax=float('Inf'), report_times=None, final_only=False, stats=None, seed=None):
+    """
+    Performs SIR simulations on a graph changing at given times.
+
+    The network starts as the first snapshot of a SnapshotSeries and
+    switches to snapshot k at snapshot_times[k-1]: the edge changes are
+    applied in place to one DynamicGraph, the graph is never rebuilt.
+    Every susceptible node with infected neighbours is a leaf of a sum
+    tree weighted by their number, infected nodes are kept in a list.
+    When the next event would happen after a snapshot time, the time is
+    set to the snapshot time, the changes are applied (adjusting the
+    counts of susceptible nodes gaining or losing an infected neighbour)
+    and a new event is drawn, which is exact as the waiting times are
+    memoryless.
+
+    :Arguments:
+
+    **series** SnapshotSeries
+        the snapshots of the network
+
+    **snapshot_times** iterable (ordered)
+        the times at which the second, third, ... snapshot becomes the
+        network; snapshots without a time are never reached
+
+    See Gillespie_SIR_CSR for the other arguments.
+
+    :Returns:
+
+    **times, S, I, R** each a numpy array
+        giving times and number in each status for corresponding time
+        (report_times if given, a single entry if final_only)
+    """
+
+    G = series.baseGraph()
+    N = len(G)
+    changes = list(zip(snapshot_times, series.deltas))
+    stream = _RandomStream_(seed)
+    uniform, exponential = stream.random, stream.exponential
+    initial_infecteds = np.unique(series.toIndices(initial_infecteds)).astype(np.int64).tolist()  # duplicates count once
+
+    started = time.perf_counter()
+    I = len(initial_infecteds)
+    R = 0
+    S = N-I
+    recorder = _Recorder_(tmin, S, I, R, report_times, final_only)
+    record = recorder.record
+
+    t = tmin
+
+    status = bytearray(N)  # 0 = S, 1 = I, 2 = R
+    status_view = np.frombuffer(status, dtype=np.uint8)
+    infected_nbrs = array('q', [0])*N
+    infected_nbrs_view = np.frombuffer(infected_nbrs, dtype=np.int64)
+    transmissions = _SumTree_(N)  # leaves: number of infected neighbours of the susceptible nodes
+    infecteds = _ListDict_()
+
+    for node in initial_infecteds:
+        status[node] = 1
+        infecteds.add(node)
+    for node in initial_infecteds:
+        nbrs = G.neighbours(node)
+        np.add.at(infected_nbrs_view, nbrs[status_view[nbrs] == 0], 1)
+    exposed = np.flatnonzero(infected_nbrs_view)
+    transmissions.update_many(exposed, infected_nbrs_view[exposed])
+    IS_count = int(infected_nbrs_view.sum())  # number of I-S links
+
+    def change(edges, sign):
+        """Adds sign to the counts of the susceptible ends of the I-S links among edges, returns their number"""
+
+        u, v = edges[:, 0], edges[:, 1]
+        targets = np.concatenate([u[(status_view[u] == 0) & (status_view[v] == 1)],
+                                  v[(status_view[v] == 0) & (status_view[u] == 1)]])
+        np.add.at(infected_nbrs_view, targets, sign)
+        nodes = np.unique(targets)
+        transmissions.update_many(nodes, infected_nbrs_view[nodes])
+        return sign*len(targets)
+
+    total_rate = gamma*I + tau*IS_count
+    delay = exponential()/total_rate if total_rate > 0 else float('Inf')
+    S_initial = S
+    scanned = 0
+    if stats is not None:
+        stats.sample(I, IS_count, IS_count)
+    events_started = time.perf_counter()
+
+    while I and t<tmax:
+        if changes and t + delay >= changes[0][0]:
+            # no event before the network changes; the waiting times are memoryless, so a new one is drawn
+            t, (added, removed) = changes.pop(0)
+            IS_count += change(removed, -1)
+            G.removeEdges(removed)
+            G.addEdges(added)
+            IS_count += change(added, 1)
+        elif t + delay >= tmax:
+            break
+        else:
+            t += delay
+            if uniform()*total_rate < gamma*I: #recover
+                node = infecteds.random_removal(uniform())
+                status[node] = 2
+                step = -1
+                I -= 1
+                R += 1
+            else: #transmit
+                node = transmissions.choose_random(uniform())
+                transmissions.update(node, 0.0)
+                status[node] = 1
+                infecteds.add(node)
+                IS_count -= infected_nbrs[node]
+                infected_nbrs[node] = 0
+                step = 1
+                S -= 1
+                I += 1
+
+            # the rows move when the graph is laid out anew, so they are looked up for every event
+            start = G.indptr_list[node]
+            stop = start + G.lengths_list[node]
+            scanned += stop - start
+            if stop - start < _NUMPY_DEGREE:
+                indices = G.indices_list
+                for position in range(start, stop):
+                    nbr = indices[position]
+                    if status[nbr] == 0:
+                        count = infected_nbrs[nbr] + step
+                        infected_nbrs[nbr] = count
+                        transmissions.update(nbr, count)
+                        IS_count += step
+            else:
+                nbrs = np.sort(G.indices[start:stop])
+                nbrs = nbrs[status_view[nbrs] == 0]
+                infected_nbrs_view[nbrs] += step
+                transmissions.update_many(nbrs, infected_nbrs_view[nbrs])
+                IS_count += step*len(nbrs)
+            record(t, S, I, R)
+        if stats is not None:
+            stats.sample(I, IS_count, IS_count)
+
+        total_rate = gamma*I + tau*IS_count
+        delay = exponential()/total_rate if total_rate > 0 else float('Inf')
+
+    events_finished = time.perf_counter()
+    result = recorder.result()
+    if stats is not None:
+        _record_stats(stats, S_initial - S, R, scanned, started, events_started, events_finished)
+    return result
+
+
+def _row_positions(indptr, nodes):
+    """Returns the CSR positions of the rows of an array of nodes, concatenated"""
+
+    starts = indptr[nodes]
+    lengths = indptr[nodes+1] - starts
+    offsets = np.repeat(np.cumsum(lengths) - lengths - starts, lengths)
+    return np.arange(int(lengths.sum()), dtype=np.int64) - offsets
+
+
+def _collect(chunks):
+    """Concatenates a list of node arrays and single nodes into one array"""
+
+    arrays = [chunk for chunk in chunks if isinstance(chunk, np.ndarray)]
+    nodes = [chunk for chunk in chunks if not isinstance(chunk, np.ndarray)]
+    return np.concatenate(arrays + [np.array(nodes, dtype=np.int64)])
+
+
+def tau_leap_SIR(G, tau, gamma, initial_infecteds=None, tmin = 0, tmax=float('Inf'), report_times=None,
+                 final_only=False, stats=None, transmission_weight=None, recovery_weight=None, epsilon=0.03,
+                 exact_events=10, seed=None):
+    """
+    Performs approximate SIR simulations by tau-leaping.
+
+    Same model, arguments and return values as Gillespie_SIR_CSR, plus
+    the accuracy parameters below. Time advances in leaps of length h
+    during which the rates are held constant: every susceptible node with
+    infection pressure p (summed weight of its edges to infected nodes)
+    is infected with probability 1-exp(-tau*p*h), every infected node
+    recovers with probability 1-exp(-gamma*w*h), drawn as vectorized
+    per-node binomial trials on the state at the start of the leap.
+
+    The leap length is chosen as in Cao, Gillespie and Petzold (2006):
+    the expected change of S and I in a leap and its standard deviation
+    stay below epsilon/2 times their values (but may reach 1). When a leap
+    would contain fewer than exact_events events on average, exact_events
+    exact Gillespie steps are taken instead (drawn from sum trees as in
+    _Gillespie_SIR_weighted), so small outbreaks and the start and end of
+    large ones are simulated exactly.
+
+    A leap costs a few vectorized passes over the infected and exposed
+    nodes, so leaping only pays off for outbreaks with many simultaneously
+    infected nodes; below that Gillespie_SIR_CSR is faster. The exact steps
+    update sum trees and are slower than those of Gillespie_SIR_CSR, which
+    makes this function slower overall on all bundled data sets (see the
+    wall times printed by validateTauLeap.py), so time_evolution does not
+    offer it as an engine.
+
+    :Arguments:
+
+    **epsilon** positive float (default 0.03)
+        accuracy, the leaps get shorter (and more) for smaller values
+
+    **exact_events** positive integer (default 10)
+        leaps expected to contain fewer events are replaced by this
+        many exact steps
+
+    See Gillespie_SIR_CSR for the other arguments.
+
+    :Returns:
+
+    **times, S, I, R** each a numpy array
+        giving times and number in each status for corresponding time
+        (report_times if given, a single entry if final_only)
+    """
+
+    if not isinstance(G, CSRGraph):
+        if isinstance(recovery_weight, str):
+            recovery_weight = {node: weight for node, weight in G.nodes(data=recovery_weight) if weight is not None}
+        G = CSRGraph.fromGraph(G, weight=transmission_weight)
+    N = len(G)
+    indptr, neighbours = G.indptr, G.indices
+    indptr_list, indices, _, _ = G.adjacencyLists()
+    edge_weights = np.ones(len(neighbours)) if G.weights is None else np.asarray(G.weights, dtype=float)
+    weights = array('d', edge_weights.tobytes())
+    recovery_weights = np.ones(N)
+    if recovery_weight is not None:
+        for node, weight in recovery_weight.items():
+            recovery_weights[G.index[node]] = weight
+    node_weights = array('d', recovery_weights.tobytes())
+    stream = _RandomStream_(seed)
+    uniform, exponential, rng = stream.random, stream.exponential, stream.generator
+    initial_infecteds = np.unique(G.toIndices(initial_infecteds)).astype(np.int64).tolist()  # duplicates count once
+
+    started = time.perf_counter()
+    I = len(initial_infecteds)
+    R = 0
+    S = N-I
+    recorder = _Recorder_(tmin, S, I, R, report_times, final_only)
+    record = recorder.record
+
+    t = tmin
+
+    # typed arrays for the exact steps, numpy views on them for the leaps
+    status_list = bytearray(N)  # 0 = S, 1 = I, 2 = R
+    status = np.frombuffer(status_list, dtype=np.uint8)
+    pressure_list = array('d', [0.0])*N
+    pressure = np.frombuffer(pressure_list, dtype=float)
+    infected_nbrs_list = array('q', [0])*N
+    infected_nbrs = np.frombuffer(infected_nbrs_list, dtype=np.int64)
+    # the exposed (susceptible with positive pressure) and the infected nodes, collected in chunks which
+    # may still contain nodes that left the set; they are filtered when needed
+    exposed_list = bytearray(N)  # 1 for the nodes collected in exposed
+    exposed_flags = np.frombuffer(exposed_list, dtype=np.uint8)
+    exposed, infecteds = [], []
+    stamp = np.zeros(N, dtype=np.int64)  # scratch space to remove duplicates
+    # sum trees for the exact steps, rebuilt after leaps
+    transmissions = _SumTree_(N)  # leaves: pressure of the susceptible nodes
+    recoveries = _SumTree_(N)  # leaves: recovery weight of the infected nodes
+
+    def current_exposed():
+        nodes = _collect(exposed)
+        valid = (status[nodes] == 0) & (infected_nbrs[nodes] > 0)
+        exposed_flags[nodes[~valid]] = 0
+        exposed[:] = [nodes[valid]]
+        return exposed[0]
+
+    def current_infecteds():
+        nodes = _collect(infecteds)
+        infecteds[:] = [nodes[status[nodes] == 1]]
+        return infecteds[0]
+
+    def build_trees():
+        transmissions.view[:] = 0.0
+        recoveries.view[:] = 0.0
+        nodes = np.sort(current_exposed())
+        transmissions.update_many(nodes, pressure[nodes])
+        nodes = np.sort(current_infecteds())
+        recoveries.update_many(nodes, recovery_weights[nodes])
+
+    def change(infected, recovered):
+        """Applies the infection and the recovery of two arrays of distinct nodes (susceptible and infected ones)
+        in a leap and returns the resulting change of the number of I-S links, the trees are not updated"""
+
+        lost_into = int(infected_nbrs[infected].sum())  # I-S links ending in the newly infected nodes
+        status[infected] = 1
+        status[recovered] = 2
+        gained = neighbours[_row_positions(indptr, infected)]
+        lost = _row_positions(indptr, recovered)
+        np.add.at(pressure, gained, edge_weights[_row_positions(indptr, infected)])
+        np.add.at(pressure, neighbours[lost], -edge_weights[lost])
+        lost = neighbours[lost]
+        np.add.at(infected_nbrs, gained, 1)
+        np.add.at(infected_nbrs, lost, -1)
+        touched = np.concatenate([gained, lost])
+        touched = touched[status[touched] == 0]
+        pressure[touched[infected_nbrs[touched] == 0]] = 0.0
+        touched = touched[exposed_flags[touched] == 0]
+        # the last occurrence of every node keeps its stamp
+        stamp[touched] = np.arange(len(touched))
+        touched = touched[stamp[touched] == np.arange(len(touched))]
+        exposed_flags[touched] = 1
+        exposed.append(touched)
+        infecteds.append(infected)
+        return (int(np.count_nonzero(status[gained] == 0)) - int(np.count_nonzero(status[lost] == 0)) - lost_into)
+
+    def step(node, infect):
+        """Infects a susceptible or cures an infected node in an exact step, returns the change of the I-S links"""
+
+        start, stop = indptr_list[node], indptr_list[node+1]
+        if stop - start >= _NUMPY_DEGREE:
+            if infect:
+                status_list[node] = 1
+                transmissions.update(node, 0.0)
+                recoveries.update(node, node_weights[node])
+                infecteds.append(node)
+            else:
+                status_list[node] = 2
+                recoveries.update(node, 0.0)
+            nbrs = neighbours[start:stop]
+            susceptible = status[nbrs] == 0
+            nbrs = nbrs[susceptible]
+            if infect:
+                links = len(nbrs) - infected_nbrs_list[node]
+                infected_nbrs[nbrs] += 1
+                pressure[nbrs] += edge_weights[start:stop][susceptible]
+                new = nbrs[exposed_flags[nbrs] == 0]
+                exposed_flags[new] = 1
+                exposed.append(new)
+            else:
+                links = -len(nbrs)
+                infected_nbrs[nbrs] -= 1
+                pressure[nbrs] -= edge_weights[start:stop][susceptible]
+                pressure[nbrs[infected_nbrs[nbrs] == 0]] = 0.0
+            transmissions.update_many(nbrs, pressure[nbrs])
+            return links
+        if infect:
+            status_list[node] = 1
+            transmissions.update(node, 0.0)
+            recoveries.update(node, node_weights[node])
+            infecteds.append(node)
+            links = -infected_nbrs_list[node]
+            for position in range(start, stop):
+                nbr = indices[position]
+                if status_list[nbr] == 0:
+                    if not exposed_list[nbr]:
+                        exposed_list[nbr] = 1
+                        exposed.append(nbr)
+                    infected_nbrs_list[nbr] += 1
+                    nbr_pressure = pressure_list[nbr] + weights[position]
+                    pressure_list[nbr] = nbr_pressure
+                    transmissions.update(nbr, nbr_pressure)
+                    links += 1
+            return links
+        status_list[node] = 2
+        recoveries.update(node, 0.0)
+        links = 0
+        for position in range(start, stop):
+            nbr = indices[position]
+            if status_list[nbr] == 0:
+                count = infected_nbrs_list[nbr] - 1
+                infected_nbrs_list[nbr] = count
+                nbr_pressure = pressure_list[nbr] - weights[position] if count else 0.0
+                pressure_list[nbr] = nbr_pressure
+                transmissions.update(nbr, nbr_pressure)
+                links -= 1
+        return links
+
+    IS_count = change(np.unique(initial_infecteds).astype(np.int64), np.zeros(0, dtype=np.int64))
+    infection_rate = tau*float(pressure[current_exposed()].sum())
+    recovery_rate = gamma*float(recovery_weights[current_infecteds()].sum())
+    filtered = True  # exposed and infecteds hold exactly the current sets
+    trees = False  # the sum trees are up to date
+    S_initial = S
+    leaps = 0
+    if stats is not None:
+        stats.sample(I, IS_count, IS_count)
+    events_started = time.perf_counter()
+
+    while I and t<tmax:
+        total_rate = infection_rate + recovery_rate
+        if total_rate <= 0:
+            break
+
+        h = float('Inf')
+        for size, drift, variance in ((S, infection_rate, infection_rate),
+                                      (I, abs(infection_rate - recovery_rate), total_rate)):
+            bound = max(epsilon*size/2, 1.0)
+            if drift > 0:
+                h = min(h, bound/drift)
+            if variance > 0:
+                h = min(h, bound*bound/variance)
+
+        if h*total_rate < exact_events:
+            if not trees:
+                build_trees()
+                trees = True
+            filtered = False
+            for _ in range(exact_events):
+                t += exponential()/total_rate
+                if t >= tmax:
+                    break
+                if uniform()*total_rate < recovery_rate:
+                    IS_count += step(recoveries.choose_random(uniform()), False)
+                    I -= 1
+                    R += 1
+                else:
+                    IS_count += step(transmissions.choose_random(uniform()), True)
+                    S -= 1
+                    I += 1
+                record(t, S, I, R)
+                if stats is not None:
+                    stats.sample(I, IS_count, IS_count)
+                infection_rate = tau*transmissions.total_weight()
+                recovery_rate = gamma*recoveries.total_weight()
+                total_rate = infection_rate + recovery_rate
+                if total_rate <= 0:
+                    break
+            continue
+
+        trees = False
+        h = min(h, tmax - t)
+        candidates = exposed[0] if filtered else current_exposed()
+        infected = candidates[rng.random(len(candidates)) < -np.expm1(-tau*h*pressure[candidates])]
+        candidates = infecteds[0] if filtered else current_infecteds()
+        recovered = candidates[rng.random(len(candidates)) < -np.expm1(-gamma*h*recovery_weights[candidates])]
+        IS_count += change(infected, recovered)
+        t += h
+        S -= len(infected)
+        I += len(infected) - len(recovered)
+        R += len(recovered)
+        leaps += 1
+        record(t, S, I, R)
+        if stats is not None:
+            stats.sample(I, IS_count, IS_count)
+        infection_rate = tau*float(pressure[current_exposed()].sum())
+        recovery_rate = gamma*float(recovery_weights[current_infecteds()].sum())
+        filtered = True
+
+    events_finished = time.perf_counter()
+    result = recorder.result()
+    if stats is not None:
+        # every node scans its neighbours when it gets infected and again when it recovers
+        degrees = G.degrees()
+        scanned = int(degrees[status != 0].sum() + degrees[status == 2].sum())
+        stats.leaps += leaps
+        _record_stats(stats, S_initial - S, R, scanned, started, events_started, events_finished)
+    return result
+
+
+def fast_SIR(G, tau, gamma, initial_infecteds=None, tmin = 0, tmax=float('Inf'), report_times=None,
+             final_only=False, stats=None, transmission_weight=None, recovery_weight=None, seed=None):
+    """
+    Performs SIR simulations with the event-driven algorithm of EoN's fast_SIR.
+
+    Same model, arguments and return values as Gillespie_SIR_CSR. When a
+    node is infected, its recovery time and the transmission time along
+    each edge to a susceptible neighbour are drawn at once; transmissions
+    later than the recovery are dropped, the others are kept in a binary
+    heap of pending events if they are earlier than the infection already
+    predicted for that neighbour. Events are taken from the heap in time
+    order, transmissions to nodes infected in the meantime are skipped.
+
+    No set of I-S links is kept: every edge is looked at once per
+    infection of an end node, so an epidemic costs O(E log N). This pays
+    off for high transmission rates, where Gillespie_SIR_CSR spends its
+    time on links that are drawn and rejected.
+
+    Neighbourhoods of high degree nodes draw their transmission times
+    as one numpy array from the generator of the random stream.
+
+    :Returns:
+
+    **times, S, I, R** each a numpy array
+        giving times and number in each status for corresponding time
+        (report_times if given, a single entry if final_only)
+    """
+
+    if not isinstance(G, CSRGraph):
+        if isinstance(recovery_weight, str):
+            recovery_weight = {node: weight for node, weight in G.nodes(data=recovery_weight) if weight is not None}
+        G = CSRGraph.fromGraph(G, weight=transmission_weight)
+    N = len(G)
+    indptr, indices, _, _ = G.adjacencyLists()
+    neighbours = G.indices
+    edge_weights = None if G.weights is None else np.asarray(G.weights, dtype=float)
+    weights = None if G.weights is None else array('d', edge_weights.tobytes())
+    recovery_weights = None
+    if recovery_weight is not None:
+        recovery_weights = array('d', [1.0])*N
+        for node, weight in recovery_weight.items():
+            recovery_weights[G.index[node]] = weight
+    stream = _RandomStream_(seed)
+    exponential, rng = stream.exponential, stream.generator
+    initial_infecteds = np.unique(G.toIndices(initial_infecteds)).astype(np.int64).tolist()  # duplicates count once
+
+    started = time.perf_counter()
+    I = len(initial_infecteds)
+    R = 0
+    S = N-I
+    recorder = _Recorder_(tmin, S, I, R, report_times, final_only)
+    record = recorder.record
+
+    status = bytearray(N)  # 0 = S, 1 = I, 2 = R
+    status_view = np.frombuffer(status, dtype=np.uint8)
+    predicted = array('d', [float('Inf')])*N  # earliest pending infection time of every node
+    predicted_view = np.frombuffer(predicted, dtype=float)
+    # pending events (time, node) with node >= 0 for an infection and ~node for a recovery
+    heap = []
+    push = heapq.heappush
+
+    def infect(node, t):
+        """Schedules the recovery of a newly infected node and its transmissions"""
+
+        if recovery_weights is None:
+            recovery_time = t + exponential()/gamma
+        else:
+            rate = gamma*recovery_weights[node]
+            recovery_time = t + exponential()/rate if rate > 0 else float('Inf')
+        push(heap, (recovery_time, ~node))
+        start, stop = indptr[node], indptr[node+1]
+        if stop - start < _NUMPY_DEGREE:
+            for position in range(start, stop):
+                nbr = indices[position]
+                if status[nbr] == 0:
+                    rate = tau if weights is None else tau*weights[position]
+                    if rate <= 0:
+                        continue
+                    transmission_time = t + exponential()/rate
+                    if transmission_time < recovery_time and transmission_time < predicted[nbr]:
+                        predicted[nbr] = transmission_time
+                        push(heap, (transmission_time, nbr))
+        else:
+            nbrs = neighbours[start:stop]
+            times = rng.standard_exponential(stop - start)
+            if edge_weights is None:
+                times = t + times/tau
+            else:
+                with np.errstate(divide='ignore'):
+                    times = t + times/(tau*edge_weights[start:stop])
+            earlier = (status_view[nbrs] == 0) & (times < recovery_time) & (times < predicted_view[nbrs])
+            nbrs, times = nbrs[earlier], times[earlier]
+            predicted_view[nbrs] = times
+            for transmission_time, nbr in zip(times.tolist(), nbrs.tolist()):
+                push(heap, (transmission_time, nbr))
+        return stop - start
+
+    for node in initial_infecteds:
+        status[node] = 1
+    scanned = 0
+    for node in initial_infecteds:
+        scanned += infect(node, tmin)
+
+    S_initial = S
+    skipped = 0
+    if stats is not None:
+        stats.sample(I, len(heap), len(heap))
+    events_started = time.perf_counter()
+
+    pop = heapq.heappop
+    while heap:
+        t, node = pop(heap)
+        if t >= tmax:
+            break
+        if node < 0: #recover
+            status[~node] = 2
+            I -= 1
+            R += 1
+        elif status[node] == 0 and predicted[node] == t: #transmit
+            status[node] = 1
+            S -= 1
+            I += 1
+            scanned += infect(node, t)
+        else:
+            # a transmission to a node infected earlier by another neighbour
+            skipped += 1
+            continue
+        record(t, S, I, R)
+        if stats is not None:
+            stats.sample(I, len(heap), len(heap))
+
+    events_finished = time.perf_counter()
+    result = recorder.result()
+    if stats is not None:
+        stats.rejected += skipped
+        # recoveries scan nothing, every infection scans the neighbourhood once
+        _record_stats(stats, S_initial - S, R, scanned, started, events_started, events_finished)
+    return result
 
 
 def subsample(report_times, times, status1, status2=None, status3 = None):
@@ -218,27 +1386,45 @@ def subsample(report_times, times, status1, status2=None, status3 = None):
     or
         **[report_status1, report_status2, report_status3]**
     In each case, these are subsampled just at report_times.
+    (report times before times[0] get the first observation)
     """
 
+    observation = _report_indices(report_times, times)
+    report_status = [np.asarray(status)[observation] for status in (status1, status2, status3) if status is not None]
+    return report_status[0] if len(report_status) == 1 else tuple(report_status)
 
-    report_status1 = []
-    next_report_index = 0
-    next_observation_index = 0
-    while next_report_index < len(report_times):
-        while next_observation_index < len(times) and times[next_observation_index]<= report_times[next_report_index]:
-            candidate = status1[next_observation_index]
-            next_observation_index += 1
-        report_status1.append(candidate)
-        next_report_index +=1
-        
-    report_status1 = scipy.array(report_status1)
+
+def subsample_batch(report_times, trajectories):
+    """
+    Subsamples many trajectories at the same report_times at once
     
-    if status2 is not None:
-        if status3 is not None:
-            report_status2, report_status3 = subsample(report_times, times, status2, status3)
-            return report_status1, report_status2, report_status3
-        else:
-            report_status2 = subsample(report_times, times, status2)
-            return report_status1, report_status2
-    else:
-        return report_status1
+    :Arguments:
+
+    **report_times** iterable (ordered)
+        times at which we want to know state of system
+
+    **trajectories** iterable
+        tuples (times, S, I, R) as returned by Gillespie_SIR
+        
+    :Returns:
+
+    **S, I, R** each a numpy array of shape (len(trajectories), len(report_times))
+        row k gives trajectory k subsampled just at report_times, so
+        averages over the replicates are S.mean(axis=0) and so on.
+    """
+
+    trajectories = list(trajectories)
+    if not trajectories:
+        return tuple(np.zeros((0, len(report_times)), dtype=np.int64) for _ in range(3))
+    # indices into the concatenated trajectories, one row per trajectory
+    offsets = np.cumsum([0] + [len(times) for times, _, _, _ in trajectories[:-1]])
+    observation = np.array([_report_indices(report_times, times) for times, _, _, _ in trajectories])
+    observation += offsets[:, None]
+    return tuple(np.concatenate([trajectory[k] for trajectory in trajectories])[observation] for k in (1, 2, 3))
+
+
+def _report_indices(report_times, times):
+    """Returns the index of the last observation at or before every report time"""
+
+    observation = np.searchsorted(times, report_times, side='right') - 1
+    return np.maximum(observation, 0)
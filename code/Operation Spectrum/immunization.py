@@ -0,0 +1,142 @@
+"""Provides functions to choose the nodes whose removal lowers the largest eigenvalue of a graph the most
+
+The nodes are chosen greedily by their eigen-drop score as in NetShield (H. Tong, B. A. Prakash et al. (2010):
+On the Vulnerability of Large Graphs). For the leading eigenpair (eig, u) of the adjacency matrix A, removing
+a set S of nodes lowers the largest eigenvalue by approximately
+    sum over i in S of (2*eig - A[i, i]) * u[i]^2  -  sum over i != j in S of 2 * A[i, j] * u[i] * u[j],
+so every chosen node only changes the scores of its neighbours.
+
+The largest eigenvalue of a graph is the largest one of its connected components, and the leading eigenvector
+is zero outside that component. The eigenpairs are therefore kept per component: removing nodes only requires
+the eigenpairs of the pieces of the component they belonged to, each obtained by eigsh started from the old
+eigenvector (or by a dense solver for small pieces), while all other components keep theirs.
+"""
+
+import heapq
+import itertools
+import numpy as np
+import scipy.sparse.csgraph
+from calculateLambda import maxEigPair
+from csrGraph import CSRGraph
+
+# Components up to this size are solved with a dense eigensolver
+DENSE_SIZE = 64
+# Relative accuracy of the eigenvalues from eigsh, more than enough to rank the nodes
+EIG_TOL = 1e-8
+
+
+def immunize(G, number_of_nodes, batch=1):
+    """Returns the nodes to immunize (remove) and the largest eigenvalue after each batch of removals
+
+    Arguments:
+        G -- a networkX graph object or CSRGraph describing the system topology
+        number_of_nodes -- the number of nodes to choose
+        batch -- the number of nodes chosen from one eigenpair before it is recomputed (default: 1, the
+            greedy choice on the exact eigenpair of the remaining graph; number_of_nodes gives plain NetShield)
+
+    Returns nodes, eigs: the labels of the chosen nodes in the order of choice and the largest eigenvalue of
+    the graph before (eigs[0]) and after every batch of removals
+    """
+
+    if not isinstance(G, CSRGraph):
+        G = CSRGraph.fromGraph(G)
+    number_of_nodes = min(number_of_nodes, len(G))
+    A = G.adjacency().tocsr()
+    indptr, indices = G.indptr, G.indices
+    weights = G.weights
+    loops = A.diagonal()
+    present = np.ones(len(G), dtype=bool)
+    local = np.zeros(len(G), dtype=np.int64)  # position of every node within its component
+
+    components = {}  # id -> (nodes, eig, vector)
+    heap = []  # (-eig, id), ids of split components are dropped lazily
+
+    keys = itertools.count()
+
+    def addComponents(nodes, vector):
+        sub = A[nodes][:, nodes]
+        count, labels = scipy.sparse.csgraph.connected_components(sub, directed=False)
+        # ordering the nodes by component turns the components into diagonal blocks
+        order = np.argsort(labels, kind='stable')
+        sub = sub[order][:, order].tocsr()
+        nodes = nodes[order]
+        if vector is not None:
+            vector = vector[order]
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(labels, minlength=count)))).tolist()
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            if stop - start == 1:
+                eig, vec = loops[nodes[start]], np.ones(1)
+            else:
+                eig, vec = _componentEigPair(sub[start:stop, start:stop], None if vector is None else vector[start:stop])
+            key = next(keys)
+            components[key] = (nodes[start:stop], eig, vec)
+            heapq.heappush(heap, (-eig, key))
+
+    def largest():
+        while heap and heap[0][1] not in components:
+            heapq.heappop(heap)
+        return heap[0][1] if heap else None
+
+    addComponents(np.arange(len(G)), None)
+    eigs = [components[largest()][1]]
+    chosen = []
+    while len(chosen) < number_of_nodes:
+        key = largest()
+        members, eig, vec = components.pop(key)
+        local[members] = np.arange(len(members))
+        score = (2 * eig - loops[members]) * vec * vec
+        for _ in range(min(batch, number_of_nodes - len(chosen), len(members))):
+            position = int(np.argmax(score))
+            node = members[position]
+            chosen.append(node)
+            present[node] = False
+            score[position] = -np.inf
+            row = slice(indptr[node], indptr[node + 1])
+            neighbours = indices[row]
+            kept = present[neighbours]
+            coupling = 2 * vec[position] if weights is None else 2 * vec[position] * weights[row][kept]
+            neighbours = local[neighbours[kept]]
+            score[neighbours] -= coupling * vec[neighbours]
+        remaining = present[members]
+        if remaining.any():
+            addComponents(members[remaining], vec[remaining])
+        key = largest()
+        eigs.append(components[key][1] if key is not None else 0.0)
+    return [G.nodes[node] for node in chosen], np.array(eigs)
+
+
+def eigenDrop(G, nodes):
+    """Returns the largest eigenvalue of a graph after removing the given nodes, without copying the graph
+
+    Arguments:
+        G -- a networkX graph object or CSRGraph describing the system topology
+        nodes -- the labels of the removed nodes
+    """
+
+    if not isinstance(G, CSRGraph):
+        G = CSRGraph.fromGraph(G)
+    present = np.ones(len(G), dtype=bool)
+    present[G.toIndices(nodes)] = False
+    if not present.any():
+        return 0.0
+    remaining = np.flatnonzero(present)
+    A = G.adjacency().tocsr()
+    return _componentEigPair(A[remaining][:, remaining], None)[0]
+
+
+def _componentEigPair(A, v0):
+    """Returns the largest eigenvalue and the non-negative leading eigenvector of a symmetric adjacency matrix
+
+    Arguments:
+        A -- the adjacency matrix as a scipy.sparse matrix
+        v0 -- an approximation of the eigenvector used as start vector, or None
+    """
+
+    if A.shape[0] <= DENSE_SIZE:
+        values, vectors = np.linalg.eigh(A.toarray())
+        vector = vectors[:, -1]
+        return values[-1], -vector if vector.sum() < 0 else vector
+    if v0 is not None:
+        # the offset keeps the start vector from vanishing where the old eigenvector was (numerically) zero
+        v0 = np.abs(v0) + 1e-6
+    return maxEigPair(A, v0=v0, tol=EIG_TOL)
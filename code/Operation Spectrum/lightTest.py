@@ -11,8 +11,9 @@ The following libraries are required:
 
 
 from centrality import crucialNodesEigenvector
-from fetchData import importEdgeListFile
+from fetchData import loadGraph
 from calculateLambda import obtainMaxEig
+from immunization import immunize
 from sirFunctions import fig_5_right
 from plotGraph import plotFromGraph
 import matplotlib
@@ -22,7 +23,7 @@ warnings.filterwarnings("ignore", category=matplotlib.cbook.mplDeprecation)
 
 # Analyzing the first data set #########################################################################################
 print("Importing graph")
-G = importEdgeListFile('data/terrorist.txt', '\t')
+G = loadGraph('data/terrorist.txt', '\t')
 print("Data set TERRORISTS")
 print(str(len(G.nodes)) + " nodes")
 print("Largest eigenvalue: " + str(round(obtainMaxEig(G), 2)))
@@ -40,6 +41,12 @@ for node in critical_nodes:
 print("Largest eigenvalue: " + str(round(obtainMaxEig(G), 2)))
 print("Immunization of critical nodes dramatically reduces the largest eigenvalue")
 
+G = loadGraph('data/terrorist.txt', '\t')
+immunized_nodes, eigs = immunize(G, 3)  # Greedy choice of the nodes lowering the largest eigenvalue the most
+print("\n"
+      "Greedily immunized nodes: " + str(immunized_nodes))
+print("Largest eigenvalue: " + str(round(eigs[-1], 2)))
+
 
 print("\n"
       "Our model suggests that the largest eigenvalue of the adjacency matrix and a constant belonging to the virus "
@@ -51,7 +58,7 @@ print("\n"
 
 # SIR simulations ######################################################################################################
 print("Importing graph")
-G = importEdgeListFile("data/as-oregon/as20000102.txt", '\t')
+G = loadGraph("data/as-oregon/as20000102.txt", '\t')
 print("Data set AS-OREGON")
 print(str(len(G.nodes)) + " nodes")
 print("Largest eigenvalue: " + str(round(obtainMaxEig(G), 2)))
@@ -71,7 +78,7 @@ fig_5_right(G, initial_size, iterations, number_of_steps)  # computation might t
 print("\n"
       "Does the model also apply for small networks?")
 print("Importing graph")
-G = importEdgeListFile('data/terrorist.txt', '\t')
+G = loadGraph('data/terrorist.txt', '\t')
 print("Data set TERRORISTS")
 
 initial_size = 3
@@ -0,0 +1,105 @@
+"""Provides the final size of SIR epidemics for all transmission rates at once via bond percolation
+
+An infected node transmits along an edge before it recovers with probability T = tau/(tau+gamma).
+Giving every edge a uniform random number u, the edge is open for all tau above gamma*u/(1-u).
+Adding the edges in the order of these thresholds to a union-find structure (Newman-Ziff) yields
+the final number of cured nodes as a step function of tau for one random realisation.
+Like every percolation mapping of SIR with exponential recovery times, this treats the edges of a
+node as independent, so the curve is an approximation of the Gillespie results (exact for fixed
+infectious periods), and it describes the state after the epidemic has died out.
+"""
+
+import numpy as np
+from csrGraph import CSRGraph
+
+
+def final_size_steps(G, gamma, initial_infecteds, seed=None):
+    """Returns the final number of cured nodes as a step function of the transmission rate for one realisation
+
+    Arguments:
+        G -- a networkX graph object or CSRGraph describing the system topology
+        gamma -- recovery rate per node
+        initial_infecteds -- labels of the initially infected nodes
+        seed -- seed or numpy Generator for the edge thresholds (default: None, unseeded)
+
+    Returns thresholds, sizes: for tau in [thresholds[k], thresholds[k+1]) the final size is sizes[k]
+    (thresholds[0] is 0, sizes[0] the number of initially infected nodes)
+    """
+
+    if not isinstance(G, CSRGraph):
+        G = CSRGraph.fromGraph(G)
+    rng = np.random.default_rng(seed)
+    upper = G.sources < G.indices  # every edge once, self-loops do not matter
+    u_nodes, v_nodes = G.sources[upper], G.indices[upper]
+    uniform = rng.random(len(u_nodes))
+    edge_thresholds = gamma * uniform / (1 - uniform)
+    order = np.argsort(edge_thresholds)
+
+    parent = list(range(len(G)))
+    component_size = [1] * len(G)
+    seeded = bytearray(len(G))
+    for node in G.toIndices(initial_infecteds):
+        seeded[node] = 1
+    total = sum(seeded)
+
+    thresholds = [0.0]
+    sizes = [total]
+    for edge, u, v in zip(order.tolist(), u_nodes[order].tolist(), v_nodes[order].tolist()):
+        while parent[u] != u:
+            parent[u] = parent[parent[u]]
+            u = parent[u]
+        while parent[v] != v:
+            parent[v] = parent[parent[v]]
+            v = parent[v]
+        if u == v:
+            continue
+        if component_size[u] < component_size[v]:
+            u, v = v, u
+        parent[v] = u
+        component_size[u] += component_size[v]
+        if seeded[u] != seeded[v]:
+            total += component_size[v] if seeded[u] else component_size[u] - component_size[v]
+            seeded[u] = 1
+            thresholds.append(edge_thresholds[edge])
+            sizes.append(total)
+    return np.array(thresholds), np.array(sizes)
+
+
+def final_size_sweep(G, gamma, initial_size=None, initial_infecteds=None, taus=None, replicates=1, seed=None,
+                     per_replicate=False):
+    """Returns the expected final number of cured nodes for many transmission rates from one pass per replicate
+
+    Arguments:
+        G -- a networkX graph object or CSRGraph describing the system topology
+        gamma -- recovery rate per node
+        initial_size -- number of initially infected nodes, drawn at random for every replicate
+        initial_infecteds -- labels of the initially infected nodes, used instead of random ones if given
+        taus -- transmission rates at which the final size is evaluated (default: None, every rate at which
+            the final size of any replicate changes, which gives the continuous curve)
+        replicates -- the number of independent realisations averaged (default: 1)
+        seed -- seed or numpy Generator (default: None, unseeded)
+        per_replicate -- when True, the final sizes of every replicate are returned instead of their average
+            (default: False)
+
+    Returns taus, the average final sizes at taus (or, with per_replicate, an array of the final sizes with one
+    row per replicate and one column per tau)
+    """
+
+    if not isinstance(G, CSRGraph):
+        G = CSRGraph.fromGraph(G)
+    rng = np.random.default_rng(seed)
+    steps = []
+    for replicate in range(replicates):
+        if initial_infecteds is None:
+            seeds = [G.nodes[i] for i in rng.choice(len(G), initial_size, replace=False)]
+        else:
+            seeds = initial_infecteds
+        steps.append(final_size_steps(G, gamma, seeds, seed=rng))
+    if taus is None:
+        taus = np.unique(np.concatenate([thresholds for thresholds, _ in steps]))
+    taus = np.asarray(taus, dtype=float)
+    final_sizes = np.array([sizes[np.searchsorted(thresholds, taus, side='right') - 1] for thresholds, sizes in steps],
+                           dtype=float).reshape(replicates, len(taus))
+    if per_replicate:
+        return taus, final_sizes
+    return taus, final_sizes.mean(axis=0)
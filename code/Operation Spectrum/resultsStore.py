@@ -0,0 +1,87 @@
+"""Provides an on-disk store of simulation results, addressed by a hash of everything the result depends on"""
+
+import os
+import json
+import hashlib
+
+
+class ResultsStore(object):
+    """Directory holding one JSON file per computed result, named after the digest of its parameters
+
+    The parameters are a JSON serializable dictionary (e.g. graph digest, model parameters, seed and engine),
+    the key is the SHA-1 digest of its canonical JSON encoding, so equal parameters always find the same file.
+    Every result is written atomically as soon as it is computed, so an interrupted sweep leaves only finished
+    points behind and a rerun resumes from there.
+
+    Arguments:
+        directory -- the directory of the store, created if it does not exist
+    """
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    def __len__(self):
+        return sum(1 for name in os.listdir(self.directory) if name.endswith('.json'))
+
+    @staticmethod
+    def key(parameters):
+        """Returns the hexadecimal key of a parameter dictionary (node labels that are no JSON types count as strings)"""
+
+        encoded = json.dumps(parameters, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha1(encoded.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def get(self, parameters):
+        """Returns the stored result belonging to the parameters or None"""
+
+        try:
+            with open(self._path(self.key(parameters)), "r") as resultFile:
+                return json.load(resultFile)['result']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, parameters, result):
+        """Stores a JSON serializable result together with its parameters and returns it as it will be loaded
+
+        Arguments:
+            parameters -- the dictionary the result depends on
+            result -- the result, tuples and numpy values should be converted by the caller
+        """
+
+        path = self._path(self.key(parameters))
+        encoded = json.dumps({'parameters': parameters, 'result': result}, default=str)
+        with open(path + '.%d.tmp' % os.getpid(), "w") as resultFile:
+            resultFile.write(encoded)
+        os.replace(path + '.%d.tmp' % os.getpid(), path)
+        return json.loads(encoded)['result']
+
+    def fetch(self, parameters, compute):
+        """Returns the stored result belonging to the parameters, computing and storing it first if there is none
+
+        Arguments:
+            parameters -- the dictionary the result depends on
+            compute -- function without arguments returning the result
+        """
+
+        result = self.get(parameters)
+        if result is None:
+            result = self.put(parameters, compute())
+        return result
+
+    def clear(self):
+        """Removes all stored results"""
+
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                os.remove(os.path.join(self.directory, name))
+
+
+def openStore(store):
+    """Returns a ResultsStore for a store, a directory path or None (then None)"""
+
+    if store is None or isinstance(store, ResultsStore):
+        return store
+    return ResultsStore(store)
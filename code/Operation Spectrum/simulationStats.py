@@ -0,0 +1,112 @@
+"""Provides an object collecting event counts, container sizes and wall times of SIR simulations"""
+
+import json
+
+
+class SimulationStats(object):
+    """Statistics of one or several simulations, filled by the engines when passed as their stats argument
+
+    Counts and phase times add up over the simulations, peaks are maxima and averages are taken over the states
+    at the start and after every event.
+    The engines only touch the object once per event, so passing None (the default everywhere) costs nothing.
+
+    Attributes:
+        simulations -- number of simulations collected
+        events -- number of events (recoveries plus transmissions)
+        recoveries -- number of recovery events
+        transmissions -- number of transmission events
+        rejected -- number of drawn I-S links that were no longer valid and had to be redrawn (CSR engine),
+            or of pending transmissions skipped as their target was already infected (fast_SIR)
+        neighbours -- number of neighbour entries scanned to update the I-S links
+        leaps -- number of tau-leaps (tau_leap_SIR), their infections and recoveries are counted as events
+        peak_infecteds, peak_links, peak_stored_links -- largest number of infected nodes, of valid I-S links and
+            of stored I-S links (including invalid ones not yet removed) at the start or after an event;
+            fast_SIR keeps no links and reports its number of pending events for both
+        phases -- wall time in seconds per phase ('setup', 'events' and 'output' of the engines, callers add theirs)
+    """
+
+    def __init__(self):
+        self.simulations = 0
+        self.events = 0
+        self.recoveries = 0
+        self.transmissions = 0
+        self.rejected = 0
+        self.neighbours = 0
+        self.leaps = 0
+        self.peak_infecteds = 0
+        self.peak_links = 0
+        self.peak_stored_links = 0
+        self.infecteds_sum = 0
+        self.links_sum = 0
+        self.samples = 0
+        self.phases = {}
+
+    def sample(self, infecteds, links, stored_links):
+        """Records the container sizes of the current state"""
+
+        self.samples += 1
+        self.infecteds_sum += infecteds
+        self.links_sum += links
+        if infecteds > self.peak_infecteds:
+            self.peak_infecteds = infecteds
+        if links > self.peak_links:
+            self.peak_links = links
+        if stored_links > self.peak_stored_links:
+            self.peak_stored_links = stored_links
+
+    def add_time(self, phase, seconds):
+        """Adds wall time to a phase"""
+
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def merge(self, other):
+        """Adds the statistics of another object (e.g. one returned by a worker process)"""
+
+        for name in ('simulations', 'events', 'recoveries', 'transmissions', 'rejected', 'neighbours', 'leaps',
+                     'infecteds_sum', 'links_sum', 'samples'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.peak_infecteds = max(self.peak_infecteds, other.peak_infecteds)
+        self.peak_links = max(self.peak_links, other.peak_links)
+        self.peak_stored_links = max(self.peak_stored_links, other.peak_stored_links)
+        for phase, seconds in other.phases.items():
+            self.add_time(phase, seconds)
+
+    @property
+    def average_infecteds(self):
+        return self.infecteds_sum / self.samples if self.samples else 0.0
+
+    @property
+    def average_links(self):
+        return self.links_sum / self.samples if self.samples else 0.0
+
+    @property
+    def events_per_second(self):
+        """Events divided by the wall time of the event loops"""
+
+        seconds = self.phases.get('events', 0.0)
+        return self.events / seconds if seconds else 0.0
+
+    def as_dict(self):
+        """Returns the statistics as a JSON serializable dictionary"""
+
+        return {'simulations': self.simulations, 'events': self.events, 'recoveries': self.recoveries,
+                'transmissions': self.transmissions, 'rejected': self.rejected, 'neighbours': self.neighbours,
+                'leaps': self.leaps,
+                'peak_infecteds': self.peak_infecteds, 'average_infecteds': self.average_infecteds,
+                'peak_links': self.peak_links, 'average_links': self.average_links,
+                'peak_stored_links': self.peak_stored_links, 'events_per_second': self.events_per_second,
+                'phases': dict(self.phases)}
+
+    def write_log(self, path, **fields):
+        """Appends the statistics together with further fields (e.g. the sweep parameters) as one JSON line to a file
+
+        Arguments:
+            path -- the log file
+            fields -- additional entries of the logged object
+        """
+
+        entry = dict(fields)
+        entry['stats'] = self.as_dict()
+        with open(path, 'a') as logFile:
+            logFile.write(json.dumps(entry) + '\n')
+
@@ -1,11 +1,33 @@
 """Provides functions to run SIR simulations"""
 
 import random
-import scipy
+import time
+import warnings
+import numpy as np
 import multiprocessing as mp
-import matplotlib.pyplot as plt
-from calculateLambda import obtainMaxEig
-from gillespieAlgorithm import Gillespie_SIR, subsample
+from contextlib import contextmanager
+from calculateLambda import obtainMaxEig, graphDigest
+from gillespieAlgorithm import Gillespie_SIR, Gillespie_SIR_CSR, fast_SIR
+from discreteSIR import discrete_SIR_batch
+from percolation import final_size_sweep
+from csrGraph import CSRGraph
+from simulationStats import SimulationStats
+from resultsStore import openStore
+
+# Simulation engines selectable in time_evolution, all sharing the signature of Gillespie_SIR
+# (tau_leap_SIR is left out, it is slower than Gillespie_SIR_CSR on the bundled data sets, see validateTauLeap.py)
+ENGINES = {'gillespie': Gillespie_SIR, 'csr': Gillespie_SIR_CSR, 'fast': fast_SIR}
+# Engines simulating all replicates at once, returning S, I, R of shape (len(report_times), replicates)
+BATCH_ENGINES = {'discrete': discrete_SIR_batch}
+# Exact engine the sequential sampling of a batch engine is checked against
+EXACT_ENGINE = 'csr'
+# Version of the random streams the engines draw for a seed, stored with every result: results of seeds
+# drawn with other streams are not reused
+RANDOM_STREAMS = 3
+
+# Graph held by a worker process of a replicate pool, shipped once by _init_worker
+_worker_graph = None
+_worker_networks = {}
 
 def s_SIR(eig, beta, delta, digits):  # Effective virus strength
     """Returns the effective virus strength of a SIR model on a graph
@@ -20,57 +42,387 @@ def s_SIR(eig, beta, delta, digits):  # Effective virus strength
     return round(eig*beta/delta, digits)
 
 
-def time_evolution(G, beta, delta, initial_size, start_time, end_time, iterations, label, opt = 'Plot', initial_nodes = []):
-    """Calculates the time evolution of a SIR model using the Gillespie algorithm by averaging over several independent simulations
+def replicate_seeds(seed, number):
+    """Returns a list of independent integer seeds derived from one seed
+
+    Arguments:
+        seed -- a non-negative integer, or None for unseeded (then a list of None is returned)
+        number -- the length of the returned list
+    """
+
+    if seed is None:
+        return [None] * number
+    return [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(number)]
+
+
+def _network(G, engine):
+    """Returns the representation of G the engine works on"""
+
+    return G if engine == 'gillespie' or isinstance(G, CSRGraph) else CSRGraph.fromGraph(G)
+
+
+def _init_worker(G):
+    """Stores the graph in a freshly started worker process of a replicate pool"""
+
+    global _worker_graph, _worker_networks
+    _worker_graph = G
+    _worker_networks = {}
+    random.seed()  # forked workers must not share the random state of the parent
+
+
+def _worker_replicate(task):
+    """Runs one replicate in a worker process on the graph shipped by _init_worker"""
+
+    engine = task[0]
+    if engine not in _worker_networks:
+        _worker_networks[engine] = _network(_worker_graph, engine)
+    return _replicate(_worker_networks[engine], *task)
+
+
+def _replicate(network, engine, beta, delta, initial_nodes, report_times, tmax, seed, instrument):
+    """Runs one simulation up to tmax and returns the number of infected and cured nodes at report_times,
+    or only at tmax if report_times is None, and its SimulationStats if instrument is True (None otherwise)"""
+
+    stats = SimulationStats() if instrument else None
+    _, _, newI, newR = ENGINES[engine](network, beta, delta, initial_infecteds=initial_nodes, tmax=tmax,
+                                       report_times=report_times, final_only=report_times is None, stats=stats,
+                                       seed=seed)
+    return newI, newR, stats
+
+
+def replicate_pool(G, workers=None):
+    """Returns a process pool for time_evolution, the graph is shipped to each worker only once
+
+    The pool can be passed as 'workers' to several time_evolution calls on the same graph.
+    Close it with pool.close() (or use it in a with statement) when done.
 
     Arguments:
         G -- a networkX graph object describing the system topology
+        workers -- the number of worker processes (default: None, one per CPU core)
+    """
+
+    return mp.Pool(workers, initializer=_init_worker, initargs=(G,))
+
+
+@contextmanager
+def _replicate_workers(G, workers):
+    """Yields None for serial execution, otherwise a replicate pool (which is closed afterwards if created here)"""
+
+    if workers == 1:
+        yield None
+    elif workers is None or isinstance(workers, int):
+        with replicate_pool(G, workers) as pool:
+            yield pool
+    else:
+        yield workers
+
+
+def _run_replicates(network, pool, engine, beta, delta, initial_nodes, report_times, end_time, seeds, stats=None):
+    """Runs one simulation per seed and returns I and R at report_times (only at end_time if report_times is None),
+    each as an array with one column per simulation. The statistics of the simulations are added to stats if given."""
+
+    if engine in BATCH_ENGINES:
+        _, I, R = BATCH_ENGINES[engine](network, beta, delta, initial_nodes, [end_time] if report_times is None else report_times,
+                                        replicates=len(seeds), seed=seeds[0])
+        return I, R
+    tasks = [(engine, beta, delta, initial_nodes, report_times, end_time, replicate_seed, stats is not None)
+             for replicate_seed in seeds]
+    if pool is None:
+        results = (_replicate(network, *task) for task in tasks)
+    else:
+        # about four chunks per worker process of the pool (a multiprocessing.Pool keeps its size in _processes)
+        results = pool.imap(_worker_replicate, tasks, chunksize=max(1, len(tasks) // (4 * pool._processes)))
+    I, R, replicate_stats = zip(*results)
+    if stats is not None:
+        for other in replicate_stats:
+            stats.merge(other)
+    return np.array(I).T, np.array(R).T
+
+
+def _check_batch_engine(network, engine, beta, delta, initial_nodes, end_time, sizes, seeds, confidence, stats=None):
+    """Warns if the final sizes of a batch engine differ significantly (by Welch's t test at the confidence level)
+    from those of one simulation of EXACT_ENGINE per seed, whose statistics are added to stats if given"""
+
+    _, R = _run_replicates(network, None, EXACT_ENGINE, beta, delta, initial_nodes, None, end_time, seeds, stats)
+    import scipy.stats
+    p_value = scipy.stats.ttest_ind(sizes, R[-1], equal_var=False).pvalue
+    if p_value < 1 - confidence:
+        warnings.warn("Engine '%s' gives a mean final size of %g, engine '%s' one of %g (p = %.3g) at beta = %g and delta = %g, "
+                      "the confidence interval is biased" % (engine, np.mean(sizes), EXACT_ENGINE, R[-1].mean(), p_value,
+                                                             beta, delta), RuntimeWarning)
+
+
+def random_initial_nodes(G, initial_size, seed = None):
+    """Returns the labels of randomly chosen initially infected nodes, as time_evolution chooses them
+
+    Arguments:
+        G -- a networkX graph object or CSRGraph (whose node list is used as it is, without a copy)
+        initial_size -- the number of nodes
+        seed -- seed or numpy Generator of the choice (default: None, seeded from the random module)
+    """
+
+    nodes = G.nodes if isinstance(G, CSRGraph) else list(G)
+    rng = np.random.default_rng(random.getrandbits(64) if seed is None else seed)
+    return [nodes[i] for i in rng.choice(len(nodes), initial_size, replace=False).tolist()]
+
+
+def final_sizes(G, beta, delta, initial_nodes, end_time, seeds, engine = 'csr'):
+    """Returns the final numbers of cured nodes of one simulation per seed as an array
+
+    For the engines of ENGINES the simulations are the ones time_evolution runs for the same seeds, so the
+    replicate seeds of a point (replicate_seeds(seed, iterations)) can be split into parts simulated separately,
+    e.g. on several machines. Batch engines draw all simulations from the first seed, their results depend on
+    how the seeds are split.
+
+    Arguments:
+        G -- a networkX graph object or CSRGraph
+        beta -- the transmission probability in the SIR model
+        delta -- the healing probability once infected in the SIR model
+        initial_nodes -- the labels of the initially infected nodes
+        end_time -- the simulation end time
+        seeds -- one seed per simulation
+        engine -- the simulation engine, a key of ENGINES or BATCH_ENGINES (default: 'csr')
+    """
+
+    _, R = _run_replicates(_network(G, engine), None, engine, beta, delta, initial_nodes, None, end_time, seeds)
+    return R[-1]
+
+
+def confidence_interval(values, confidence = 0.95):
+    """Returns the mean of a sample and the bounds of its Student t confidence interval
+
+    Arguments:
+        values -- the sample (at least two values for a finite interval)
+        confidence -- the confidence level (default: 0.95)
+    """
+
+    values = np.asarray(values, dtype=float)
+    mean = float(values.mean())
+    if len(values) < 2:
+        return mean, -np.inf, np.inf
+    import scipy.stats  # imported here, it takes most of the import time of this module
+    half_width = float(scipy.stats.t.ppf((1 + confidence) / 2, len(values) - 1) * values.std(ddof=1) / np.sqrt(len(values)))
+    return mean, mean - half_width, mean + half_width
+
+
+def time_evolution(G, beta, delta, initial_size, start_time, end_time, iterations, label, opt = 'Plot', initial_nodes = [],
+                   engine = 'gillespie', workers = 1, seed = None, rel_width = None, batch = 20, confidence = 0.95,
+                   stats = None, log = None, store = None, digest = None):
+    """Calculates the time evolution of a SIR model using the Gillespie algorithm by averaging over several independent simulations
+
+    Arguments:
+        G -- a networkX graph object describing the system topology (or a CSRGraph for engines other than 'gillespie')
         beta -- the transmission probability in the SIR model
         delta -- the healing probability once infected in the SIR model
         initial_size -- the initial size of the infected population
         start_time -- the simulation start time
         end_time -- the simulation end time
-        iterations -- the number of independent simulations (the average value is returned)
+        iterations -- the number of independent simulations (the average value is returned), the maximum number if rel_width is given
         label -- the label of the curve in the crated graph
         opt -- determines what is returned (default: 'Plot'):
             'Plot' -- a double logarithmic plot (using matplotlib) is created
             'number_of_cured_nodes' --
+            'final_size_statistics' -- a dictionary with the average number of cured nodes at end_time ('mean'),
+                its confidence interval ('interval', a pair) and the number of simulations run ('runs')
+            'time_series' -- the arrays times, I, R with the average numbers of infected and cured nodes at
+                1000 times from start_time to end_time
         critical_nodes -- the indices of the initially infected nodes, randomly chosen if empty list (default: [])
+        engine -- the simulation engine, a key of ENGINES (default: 'gillespie'):
+            'gillespie' -- Gillespie_SIR working on the networkX graph
+            'csr' -- Gillespie_SIR_CSR working on an array-backed copy of the graph built once per call
+            'fast' -- fast_SIR, event-driven with a heap of pending events, fastest for high transmission rates
+            'discrete' -- discrete_SIR_batch, a discrete-time approximation running all iterations
+                as one vectorized batch in the calling process
+        workers -- number of worker processes running the simulations, None for one per CPU core,
+            or a pool from replicate_pool (default: 1, no parallelization; ignored by batch engines)
+        seed -- seed making the result reproducible for any number of workers, every simulation gets
+            its own random stream derived from it (default: None, unseeded)
+        rel_width -- when given, the number of cured nodes is obtained by sequential sampling: simulations are run
+            in batches until the confidence interval of the average is at most rel_width times the average wide,
+            or iterations simulations were run; for a batch engine batch more simulations of EXACT_ENGINE are run
+            afterwards, warning if their mean differs significantly (default: None, always run iterations simulations;
+            ignored for 'Plot')
+        batch -- the number of simulations per batch of the sequential sampling (default: 20)
+        confidence -- the confidence level of the interval (default: 0.95)
+        stats -- a SimulationStats object the statistics of all simulations of this call are added to, together
+            with the wall times of the phases 'simulations' and 'reduction' (default: None, not instrumented;
+            batch engines only report the phase times)
+        log -- path of a file to which the statistics of this call are appended as one JSON line, together
+            with its parameters (default: None, no log)
+        store -- a ResultsStore or its directory: a seeded result is looked up there and only computed (and then stored)
+            if it is missing; stats and log only cover computed results (default: None, always compute)
+        digest -- graphDigest(G), the graph part of the store key, passed by sweeps so it is computed only once
+            (default: None, computed here if a store is used)
     """
 
-    report_times = scipy.linspace(start_time, end_time, 1000)
-    Isum = scipy.zeros(len(report_times))
-    Rsum = scipy.zeros(len(report_times))
-    for i in range(iterations):
-        if not initial_nodes:
-            initial_nodes = random.sample(G.nodes, initial_size)
-        else:
-            initial_nodes = initial_nodes
-        t, S, I, R = Gillespie_SIR(G, beta, delta, initial_infecteds=initial_nodes)
-        _, newI, newR = subsample(report_times, t, S, I, R)
-        Isum += newI
-        Rsum += newR
-    I_average = Isum / float(iterations)
-    R_average = Rsum / float(iterations)
+    if not initial_nodes:
+        initial_nodes = random_initial_nodes(G, initial_size, seed)
+        parameter_nodes = None  # the seed determines the random initial nodes
+    else:
+        parameter_nodes = list(initial_nodes)
+    # the number of cured nodes and its statistics need the state at end_time only, the plot the whole time series
+    final_only = opt != 'Plot' and opt != 'time_series'
+    store = openStore(store)
+    if store is None or seed is None:
+        result = _simulate_point(G, beta, delta, initial_nodes, start_time, end_time, iterations, final_only, engine, workers,
+                                 seed, rel_width, batch, confidence, stats, log)
+    else:
+        parameters = {'kind': 'final_size_statistics' if final_only else 'time_series', 'graph': digest or graphDigest(G),
+                      'beta': float(beta), 'delta': float(delta), 'initial_size': initial_size, 'initial_nodes': parameter_nodes,
+                      'start_time': start_time, 'end_time': end_time, 'iterations': iterations, 'engine': engine,
+                      'seed': seed, 'streams': RANDOM_STREAMS, 'rel_width': rel_width if final_only else None,
+                      'batch': batch if final_only else None, 'confidence': confidence if final_only else None}
+        result = store.fetch(parameters, lambda: _simulate_point(G, beta, delta, initial_nodes, start_time, end_time, iterations,
+                                                                 final_only, engine, workers, seed, rel_width, batch, confidence,
+                                                                 stats, log))
     if (opt == 'Plot'):
-        plt.loglog(report_times, I_average/(len(G)), label = label, linewidth = 2)
+        import matplotlib.pyplot as plt
+        plt.loglog(result['times'], np.array(result['I'])/(len(G)), label = label, linewidth = 2)
     elif (opt == 'number_of_cured_nodes'):
-        return R_average[-1]
+        return result['mean']
+    elif (opt == 'final_size_statistics'):
+        return {'mean': result['mean'], 'interval': tuple(result['interval']), 'runs': result['runs']}
+    elif (opt == 'time_series'):
+        return np.array(result['times']), np.array(result['I']), np.array(result['R'])
     else:
         print("Invalid 'opt' parameter passed!")
 
 
-def fig_5_left(G, initial_size, iterations, initial_nodes  = [], curves = 4, beta = [0.15, 0.05, 0.02, 0.01], delta =[1, 1, 1, 1]):
-    """Plots the infective fraction of a population vs time using an SIR simulation on a graph with multiple iterations and averaging
+def _simulate_point(G, beta, delta, initial_nodes, start_time, end_time, iterations, final_only, engine, workers, seed,
+                    rel_width, batch, confidence, stats, log):
+    """Runs the simulations of time_evolution and returns the averaged time series ('times', 'I', 'R' and 'runs')
+    or, if final_only is True, the final size statistics ('mean', 'interval' and 'runs') as JSON serializable dictionary"""
+
+    point_stats = SimulationStats() if stats is not None or log is not None else None
+    started = time.perf_counter()
+    report_times = np.linspace(start_time, end_time, 1000)
+    seeds = replicate_seeds(seed, iterations)
+    with _replicate_workers(G, 1 if engine in BATCH_ENGINES else workers) as pool:
+        network = _network(G, engine) if pool is None else None
+        if rel_width is None or not final_only:
+            I, R = _run_replicates(network, pool, engine, beta, delta, initial_nodes, None if final_only else report_times,
+                                   end_time, seeds, point_stats)
+        else:
+            I, R = np.zeros((1, 0)), np.zeros((1, 0))
+            while R.shape[1] < iterations:
+                newI, newR = _run_replicates(network, pool, engine, beta, delta, initial_nodes, None, end_time,
+                                             seeds[R.shape[1]:R.shape[1] + batch], point_stats)
+                I, R = np.hstack((I, newI)), np.hstack((R, newR))
+                mean, low, high = confidence_interval(R[-1], confidence)
+                if high - low <= rel_width * abs(mean):
+                    break
+            if engine in BATCH_ENGINES:
+                _check_batch_engine(network, engine, beta, delta, initial_nodes, end_time, R[-1],
+                                    replicate_seeds(seed, iterations + batch)[iterations:], confidence, point_stats)
+    simulated = time.perf_counter()
+    # I and R have one column per simulation
+    I_average = I.mean(axis=1)
+    R_average = R.mean(axis=1)
+    if point_stats is not None:
+        point_stats.add_time('simulations', simulated - started)
+        point_stats.add_time('reduction', time.perf_counter() - simulated)
+        if stats is not None:
+            stats.merge(point_stats)
+        if log is not None:
+            point_stats.write_log(log, beta=float(beta), delta=float(delta), initial_size=len(initial_nodes), engine=engine,
+                                  runs=R.shape[1], seed=seed)
+    if final_only:
+        mean, low, high = confidence_interval(R[-1], confidence)
+        return {'mean': mean, 'interval': [low, high], 'runs': R.shape[1]}
+    return {'times': report_times.tolist(), 'I': I_average.tolist(), 'R': R_average.tolist(), 'runs': R.shape[1]}
+
+
+def tipping_point(betas, footprints):
+    """Returns the transmission rate at which the footprint curve rises fastest on double logarithmic axes
+
+    Arguments:
+        betas -- increasing transmission rates (at least two)
+        footprints -- the final numbers of cured nodes at betas
+
+    Returns the geometric midpoint of the interval between neighbouring points with the steepest slope
+    """
+
+    betas = np.asarray(betas, dtype=float)
+    slope = np.diff(np.log1p(footprints)) / np.diff(np.log(betas))
+    k = int(np.argmax(slope))
+    return float(np.sqrt(betas[k] * betas[k + 1]))
+
+
+def adaptive_sweep(G, initial_size, iterations, coarse_steps = 9, tolerance = 0.05, max_points = 30, initial_nodes = [],
+                   start_time = 0, end_time = 100, engine = 'gillespie', workers = 1, seed = None, rel_width = None, batch = 20,
+                   log = None, store = None, digest = None):
+    """Samples the virus footprint vs effective virus strength curve densely only around the tipping point
+
+    The curve is sampled on a coarse logarithmic grid from 0.01 to 100 first. Then the interval over which the logarithm
+    of the footprint changes the most is split at its geometric midpoint, until the interval with the steepest slope
+    (which locates the tipping point, see tipping_point) is narrower than a factor of 1 + tolerance, no interval wider
+    than that is left to split, or max_points points were sampled.
+
+    Arguments:
+        G -- a networkX graph object describing the system topology
+        initial_size -- the initial size of the infected population
+        iterations -- the number of independent simulations per point (the maximum number if rel_width is given)
+        coarse_steps -- number of points of the initial grid (default: 9)
+        tolerance -- relative accuracy of the tipping point (default: 0.05)
+        max_points -- maximum number of sampled points (default: 30)
+        critical_nodes -- the indices of the initially infected nodes, randomly chosen if empty list (default: [])
+        start_time -- the simulation start time (default: 0)
+        end_time -- the simulation end time (default: 100)
+        engine -- the simulation engine passed to time_evolution (default: 'gillespie')
+        workers -- number of worker processes shared by all points, None for one per CPU core (default: 1)
+        seed -- seed making the result reproducible for any number of workers (default: None, unseeded)
+        rel_width -- target relative width of the confidence interval of every point (see time_evolution)
+        batch -- the number of simulations per batch when rel_width is given (default: 20)
+        log -- path of a file to which the statistics of every point are appended as JSON lines (see time_evolution)
+        store -- a ResultsStore or its directory the points are looked up in and stored to (see time_evolution)
+        digest -- graphDigest(G) if already known (default: None, computed once if a store is used)
+
+    Returns points, threshold: the statistics of the sampled points ordered by effective strength (see fig_5_right)
+    and the estimated tipping point as effective strength (None for a single point)
+    """
+
+    eig = obtainMaxEig(G)
+    seeds = replicate_seeds(seed, max(max_points, coarse_steps))
+    store = openStore(store)
+    if digest is None and store is not None and seed is not None:
+        digest = graphDigest(G)
+    points = {}
+    with _replicate_workers(G, workers) as pool:
+
+        def sample(beta):
+            points[beta] = time_evolution(G, beta, eig, initial_size, start_time, end_time, iterations, "", opt='final_size_statistics',
+                                          initial_nodes=initial_nodes, engine=engine, workers=pool or 1, seed=seeds[len(points)],
+                                          rel_width=rel_width, batch=batch, log=log, store=store, digest=digest)
+            points[beta]['beta'] = beta
+
+        for beta in np.logspace(-2, 2, coarse_steps):
+            sample(float(beta))
+        while 1 < len(points) < max_points:
+            betas = np.array(sorted(points))
+            footprints = np.log1p([points[beta]['mean'] for beta in betas])
+            ratio = betas[1:] / betas[:-1]
+            steepest = int(np.argmax(np.diff(footprints) / np.log(ratio)))
+            change = np.where(ratio > 1 + tolerance, np.abs(np.diff(footprints)), -1)
+            k = int(np.argmax(change))
+            if ratio[steepest] <= 1 + tolerance or change[k] < 0:
+                break
+            sample(float(np.sqrt(betas[k] * betas[k + 1])))
+    betas = sorted(points)
+    threshold = tipping_point(betas, [points[beta]['mean'] for beta in betas]) if len(betas) > 1 else None
+    return [points[beta] for beta in betas], threshold
+
+
+def compute_fig_5_left(G, initial_size, iterations, initial_nodes = [], curves = 4, beta = [0.15, 0.05, 0.02, 0.01],
+                       delta = [1, 1, 1, 1], engine = 'gillespie', workers = 1, seed = None, store = None):
+    """Computes the average infective fraction of a population vs time for several SIR parameters (the data of fig_5_left)
 
         Arguments:
-            G -- a networkX graph object describing the system topology
-            initial_size -- the initial size of the infected population
-            iterations -- the number of independent simulations (the average value is returned)
-            critical_nodes -- the indices of the initially infected nodes, randomly chosen if empty list (default: [])
-            curves -- number of independent curves in the plot
-            beta -- array of SIR beta values, same length as delta (default: [1, 1, 1, 1])
-            delta -- array of SIR delta values, same length as beta (default: [0.15, 0.05, 0.02, 0.01])
+            see fig_5_left
+            store -- a ResultsStore or its directory the curves are looked up in and stored to, effective only
+                together with a seed (see time_evolution, default: None, always compute)
+
+        Returns one dictionary per curve with the effective strength 's', 'beta', 'delta' and the arrays 'times'
+        and 'infected_fraction'
     """
 
     eig = obtainMaxEig(G)
@@ -78,77 +430,269 @@ def fig_5_left(G, initial_size, iterations, initial_nodes  = [], curves = 4, bet
     start_time = 0
     end_time = 10
 
-    label = []
-    for i in range(curves):
-        label.append(r's = ' + str(s_SIR(eig, beta[i], delta[i], digits)))
-        time_evolution(G, beta[i], delta[i], initial_size, start_time, end_time,
-                   iterations, label[i], initial_nodes = initial_nodes)
+    results = []
+    seeds = replicate_seeds(seed, curves)
+    store = openStore(store)
+    with _replicate_workers(G, workers) as pool:
+        for i in range(curves):
+            times, I, _ = time_evolution(G, beta[i], delta[i], initial_size, start_time, end_time, iterations, "",
+                                         opt = 'time_series', initial_nodes = initial_nodes, engine = engine,
+                                         workers = pool or 1, seed = seeds[i], store = store)
+            results.append({'s': s_SIR(eig, beta[i], delta[i], digits), 'beta': beta[i], 'delta': delta[i],
+                            'times': times, 'infected_fraction': I/len(G)})
+    return results
+
+
+def plot_fig_5_left(curves, show = True):
+    """Plots the infective fraction vs time curves returned by compute_fig_5_left on double logarithmic axes
+
+        Arguments:
+            curves -- the result of compute_fig_5_left
+            show -- determines whether the plot is shown
+    """
+
+    import matplotlib.pyplot as plt
+    for curve in curves:
+        plt.loglog(curve['times'], curve['infected_fraction'], label = r's = ' + str(curve['s']), linewidth = 2)
     plt.legend()
     plt.xlabel("Time ticks")
     plt.ylabel("Fraction of Infected People")
     plt.grid()
-    plt.show()
+    if show:
+        plt.show()
 
 
-def fig_5_right(G, initial_size, iterations, number_of_steps, initial_nodes = [], show = True):
-    """Plots the virus footprint vs effective virus strength using an SIR simulation on a graph with multiple iterations and averaging
+def fig_5_left(G, initial_size, iterations, initial_nodes  = [], curves = 4, beta = [0.15, 0.05, 0.02, 0.01], delta =[1, 1, 1, 1],
+               engine = 'gillespie', workers = 1, seed = None, store = None):
+    """Plots the infective fraction of a population vs time using an SIR simulation on a graph with multiple iterations and averaging
 
         Arguments:
             G -- a networkX graph object describing the system topology
             initial_size -- the initial size of the infected population
             iterations -- the number of independent simulations (the average value is returned)
-            number_of_steps -- number of different virus strenghts (along x-axis)
             critical_nodes -- the indices of the initially infected nodes, randomly chosen if empty list (default: [])
-            parallel -- states whether parallelized for loops from joblib are used, potentially causing problems (default: False)
-            show -- determines whether the plot is shown
+            curves -- number of independent curves in the plot
+            beta -- array of SIR beta values, same length as delta (default: [1, 1, 1, 1])
+            delta -- array of SIR delta values, same length as beta (default: [0.15, 0.05, 0.02, 0.01])
+            engine -- the simulation engine passed to time_evolution (default: 'gillespie')
+            workers -- number of worker processes shared by all curves, None for one per CPU core (default: 1)
+            seed -- seed making the plot reproducible for any number of workers (default: None, unseeded)
+            store -- a ResultsStore or its directory, a seeded plot is then drawn from stored curves (see compute_fig_5_left)
+    """
+
+    plot_fig_5_left(compute_fig_5_left(G, initial_size, iterations, initial_nodes, curves, beta, delta, engine, workers,
+                                       seed, store))
+
+
+def _percolation_points(G, eig, initial_size, initial_nodes, beta_range, iterations, seed, store, digest, confidence = 0.95):
+    """Returns the point statistics of a final_size_sweep over beta_range (see fig_5_right), stored if seeded
+
+    The final sizes are those of an unlimited simulation time, an approximation of the final sizes at a finite end time.
+    """
+
+    def compute():
+        _, final_sizes = final_size_sweep(G, eig, initial_size, initial_nodes or None, beta_range, iterations, seed,
+                                          per_replicate=True)
+        statistics = []
+        for beta, values in zip(beta_range, final_sizes.T):
+            mean, low, high = confidence_interval(values, confidence)
+            statistics.append({'mean': mean, 'interval': [low, high], 'runs': iterations, 'beta': float(beta)})
+        return statistics
+
+    if store is None or seed is None:
+        statistics = compute()
+    else:
+        parameters = {'kind': 'percolation_sweep', 'graph': digest or graphDigest(G), 'eig': float(eig),
+                      'initial_size': initial_size, 'initial_nodes': list(initial_nodes) or None,
+                      'betas': [float(beta) for beta in beta_range], 'iterations': iterations, 'seed': seed,
+                      'confidence': confidence}
+        statistics = store.fetch(parameters, compute)
+    return [dict(point, interval=tuple(point['interval'])) for point in statistics]
+
+
+def compute_fig_5_right(G, initial_size, iterations, number_of_steps, initial_nodes = [], engine = 'gillespie', workers = 1,
+                        seed = None, rel_width = None, batch = 20, adaptive = False, tolerance = 0.05, max_points = 30,
+                        log = None, store = None):
+    """Computes the virus footprint vs effective virus strength (the data of fig_5_right)
+
+        Arguments:
+            see fig_5_right
+            store -- a ResultsStore or its directory the points are looked up in and stored to, effective only
+                together with a seed; an interrupted sweep resumes at its first missing point (default: None)
+
+        Returns statistics, threshold as fig_5_right
     """
 
     start_time = 0
     end_time = 100
     eig = obtainMaxEig(G)
-    beta_range = scipy.logspace(-2, 2, number_of_steps)
-    final_number_of_cured_nodes = scipy.zeros_like(beta_range)
-    for i, beta in enumerate(beta_range):
-        final_number_of_cured_nodes[i] = time_evolution(G, beta, eig, initial_size, start_time, end_time, iterations, "", opt ='number_of_cured_nodes', initial_nodes = initial_nodes)
-    plt.semilogx(beta_range, final_number_of_cured_nodes, linewidth = 2)
+    beta_range = np.logspace(-2, 2, number_of_steps)
+    seeds = replicate_seeds(seed, number_of_steps)
+    store = openStore(store)
+    digest = graphDigest(G) if store is not None and seed is not None else None
+    if engine == 'percolation':
+        statistics = _percolation_points(G, eig, initial_size, initial_nodes, beta_range, iterations, seeds[0], store, digest)
+    elif adaptive:
+        statistics, _ = adaptive_sweep(G, initial_size, iterations, number_of_steps, tolerance, max_points, initial_nodes,
+                                       start_time, end_time, engine, workers, seed, rel_width, batch, log, store, digest)
+    else:
+        statistics = []
+        with _replicate_workers(G, workers) as pool:
+            for i, beta in enumerate(beta_range):
+                statistics.append(time_evolution(G, beta, eig, initial_size, start_time, end_time, iterations, "", opt ='final_size_statistics', initial_nodes = initial_nodes,
+                                                 engine = engine, workers = pool or 1, seed = seeds[i], rel_width = rel_width, batch = batch,
+                                                 log = log, store = store, digest = digest))
+                statistics[i]['beta'] = float(beta)
+    betas = [point['beta'] for point in statistics]
+    return statistics, tipping_point(betas, [point['mean'] for point in statistics]) if len(betas) > 1 else None
+
+
+def plot_fig_5_right(statistics, label = None, show = True):
+    """Plots point statistics returned by compute_fig_5_right as virus footprint vs effective virus strength
+
+        Arguments:
+            statistics -- the point statistics of one curve
+            label -- the label of the curve in the legend (default: None, no legend entry)
+            show -- determines whether the plot is shown
+    """
+
+    import matplotlib.pyplot as plt
+    plt.semilogx([point['beta'] for point in statistics], [point['mean'] for point in statistics], label = label, linewidth = 2)
     plt.grid()
     plt.xlabel(r'Effective Strength of Virus $\lambda_1\beta/\delta$')
     plt.ylabel("Final Number of Cured Nodes")
+    if label is not None:
+        plt.legend()
     if show:
         plt.show()
 
 
-def fig_5_right_initial(G, initial_sizes, iterations, number_of_steps, initial_nodes = [], show = True):
-    """Plots multple virus footprint vs effective virus strength graphs with different initial infected populations
-       using an SIR simulation on a graph with multiple iterations and averaging
+def fig_5_right(G, initial_size, iterations, number_of_steps, initial_nodes = [], show = True, engine = 'gillespie',
+                workers = 1, seed = None, rel_width = None, batch = 20, adaptive = False, tolerance = 0.05, max_points = 30,
+                log = None, store = None):
+    """Plots the virus footprint vs effective virus strength using an SIR simulation on a graph with multiple iterations and averaging
 
         Arguments:
             G -- a networkX graph object describing the system topology
-            initial_sizes -- list of initial sizes of infected population, each leading to curve in the plot
+            initial_size -- the initial size of the infected population
             iterations -- the number of independent simulations (the average value is returned)
             number_of_steps -- number of different virus strenghts (along x-axis)
             critical_nodes -- the indices of the initially infected nodes, randomly chosen if empty list (default: [])
-            parallel -- states whether parallelized for loops from joblib are used, potentially causing problems (default: False)
             show -- determines whether the plot is shown
+            engine -- the simulation engine passed to time_evolution, or 'percolation' to obtain all points
+                from one final_size_sweep pass per iteration; its final sizes are those of an unlimited time instead
+                of time 100, which the legend of the plot states (default: 'gillespie')
+            workers -- number of worker processes shared by all points, None for one per CPU core (default: 1)
+            seed -- seed making the plot reproducible for any number of workers (default: None, unseeded)
+            rel_width -- target relative width of the confidence interval of every point, iterations is then the
+                maximum number of simulations per point (default: None, iterations simulations per point)
+            batch -- the number of simulations per batch when rel_width is given (default: 20)
+            adaptive -- when True, number_of_steps points form a coarse grid that is refined around the tipping point
+                by adaptive_sweep (default: False; ignored for 'percolation')
+            tolerance -- relative accuracy of the tipping point in adaptive mode (default: 0.05)
+            max_points -- maximum number of points in adaptive mode (default: 30)
+            log -- path of a file to which the statistics of every point are appended as JSON lines
+                (see time_evolution, default: None, no log)
+            store -- a ResultsStore or its directory, a seeded plot is then drawn from stored points (see compute_fig_5_right)
+
+        Returns statistics, threshold: a list with the statistics of every point (see time_evolution with
+        opt='final_size_statistics') extended by the transmission rate 'beta',
+        and the estimated tipping point (see tipping_point, None for a single point)
+    """
+
+    statistics, threshold = compute_fig_5_right(G, initial_size, iterations, number_of_steps, initial_nodes, engine, workers,
+                                                seed, rel_width, batch, adaptive, tolerance, max_points, log, store)
+    plot_fig_5_right(statistics, label = "percolation (unlimited time)" if engine == 'percolation' else None, show = show)
+    return statistics, threshold
+
+
+def compute_fig_5_right_initial(G, initial_sizes, iterations, number_of_steps, initial_nodes = [], engine = 'gillespie',
+                                workers = 1, seed = None, rel_width = None, batch = 20, adaptive = False, tolerance = 0.05,
+                                max_points = 30, log = None, store = None):
+    """Computes one virus footprint vs effective virus strength curve per initial size (the data of fig_5_right_initial)
+
+        Arguments:
+            see fig_5_right_initial
+            store -- a ResultsStore or its directory the points are looked up in and stored to (see compute_fig_5_right)
+
+        Returns one pair of point statistics and tipping point (see fig_5_right) per initial size
     """
 
+    if engine == 'percolation':
+        raise ValueError("Engine 'percolation' gives the final sizes of an unlimited time, not those at end time 10")
     start_time = 0
     end_time = 10
     eig = obtainMaxEig(G)
-    beta_range = scipy.logspace(-2, 2, number_of_steps)
-    final_number_of_cured_nodes = scipy.zeros_like(beta_range)
-    for j in range(len(initial_sizes)):
-        for i, beta in enumerate(beta_range):
-            if not initial_nodes:
-                final_number_of_cured_nodes[i] = time_evolution(G, beta, eig, initial_sizes[j], start_time, end_time, iterations, "", opt='number_of_cured_nodes')
+    beta_range = np.logspace(-2, 2, number_of_steps)
+    seeds = replicate_seeds(seed, len(initial_sizes) * number_of_steps)
+    store = openStore(store)
+    digest = graphDigest(G) if store is not None and seed is not None else None
+    curves = []
+    with _replicate_workers(G, workers) as pool:
+        for j in range(len(initial_sizes)):
+            if adaptive:
+                statistics, _ = adaptive_sweep(G, initial_sizes[j], iterations, number_of_steps, tolerance, max_points,
+                                               initial_nodes[j] if initial_nodes else [], start_time, end_time, engine,
+                                               pool or 1, seeds[j * number_of_steps], rel_width, batch, log, store, digest)
             else:
-               final_number_of_cured_nodes[i] = time_evolution(G, beta, eig, initial_sizes[j], start_time, end_time, iterations, "", opt='number_of_cured_nodes',
-                                                                initial_nodes=initial_nodes[j])
-        plt.semilogx(beta_range, final_number_of_cured_nodes, label = str(initial_sizes[j]) + " nodes", linewidth = 2)
-    plt.grid()
-    plt.legend()
-    plt.xlabel(r'Effective Strength of Virus $\lambda_1\beta/\delta$')
-    plt.ylabel("Final Number of Cured Nodes")
-    plt.grid()
-    if(show):
+                statistics = []
+                for i, beta in enumerate(beta_range):
+                    point_seed = seeds[j * number_of_steps + i]
+                    statistics.append(time_evolution(G, beta, eig, initial_sizes[j], start_time, end_time, iterations, "", opt='final_size_statistics',
+                                                     initial_nodes=initial_nodes[j] if initial_nodes else [], engine=engine, workers=pool or 1,
+                                                     seed=point_seed, rel_width=rel_width, batch=batch, log=log, store=store,
+                                                     digest=digest))
+                    statistics[i]['beta'] = float(beta)
+            betas = [point['beta'] for point in statistics]
+            curves.append((statistics, tipping_point(betas, [point['mean'] for point in statistics]) if len(betas) > 1 else None))
+    return curves
+
+
+def plot_fig_5_right_initial(curves, initial_sizes, show = True):
+    """Plots the curves returned by compute_fig_5_right_initial, labelled by their initial sizes
+
+        Arguments:
+            curves -- the result of compute_fig_5_right_initial
+            initial_sizes -- the initial sizes the curves were computed for
+            show -- determines whether the plot is shown
+    """
+
+    import matplotlib.pyplot as plt
+    for (statistics, _), initial_size in zip(curves, initial_sizes):
+        plot_fig_5_right(statistics, label = str(initial_size) + " nodes", show = False)
+    if show:
         plt.show()
+
+
+def fig_5_right_initial(G, initial_sizes, iterations, number_of_steps, initial_nodes = [], show = True, engine = 'gillespie',
+                        workers = 1, seed = None, rel_width = None, batch = 20, adaptive = False, tolerance = 0.05, max_points = 30,
+                        log = None, store = None):
+    """Plots multple virus footprint vs effective virus strength graphs with different initial infected populations
+       using an SIR simulation on a graph with multiple iterations and averaging
+
+        Arguments:
+            G -- a networkX graph object describing the system topology
+            initial_sizes -- list of initial sizes of infected population, each leading to curve in the plot
+            iterations -- the number of independent simulations (the average value is returned)
+            number_of_steps -- number of different virus strenghts (along x-axis)
+            critical_nodes -- the indices of the initially infected nodes, randomly chosen if empty list (default: [])
+            show -- determines whether the plot is shown
+            engine -- the simulation engine passed to time_evolution (default: 'gillespie'; 'percolation' is rejected,
+                the curves end at time 10)
+            workers -- number of worker processes shared by all points, None for one per CPU core (default: 1)
+            seed -- seed making the plot reproducible for any number of workers (default: None, unseeded)
+            rel_width -- target relative width of the confidence interval of every point (see fig_5_right)
+            batch -- the number of simulations per batch when rel_width is given (default: 20)
+            adaptive -- when True, every curve is refined around its tipping point (see fig_5_right)
+            tolerance -- relative accuracy of the tipping points in adaptive mode (default: 0.05)
+            max_points -- maximum number of points per curve in adaptive mode (default: 30)
+            log -- path of a file to which the statistics of every point are appended as JSON lines (see fig_5_right)
+            store -- a ResultsStore or its directory, a seeded plot is then drawn from stored points (see compute_fig_5_right)
+
+        Returns one pair of point statistics and tipping point (see fig_5_right) per initial size
+    """
+
+    curves = compute_fig_5_right_initial(G, initial_sizes, iterations, number_of_steps, initial_nodes, engine, workers, seed,
+                                         rel_width, batch, adaptive, tolerance, max_points, log, store)
+    plot_fig_5_right_initial(curves, initial_sizes, show)
+    return curves
@@ -0,0 +1,314 @@
+"""Provides series of graph snapshots (e.g. the dated AS graphs of as-oregon) stored as a base graph and edge deltas"""
+
+import os
+from array import array
+import numpy as np
+import scipy.sparse
+from calculateLambda import maxEigPair
+from csrGraph import CSRGraph
+from fetchData import loadEdgeList
+
+# Relative accuracy of the eigenvalues of the snapshots
+EIG_TOL = 1e-8
+# Free entries reserved per row when the rows are laid out: a row of length l gets room for 2*l + ROW_SLACK
+ROW_SLACK = 4
+
+
+class DynamicGraph(object):
+    """Undirected graph on a fixed set of nodes 0..N-1 whose edges are added and removed in place
+
+    The rows are stored like the CSR arrays of a CSRGraph, but every row has free entries behind its
+    neighbours: the neighbours of node i are indices[indptr[i]:indptr[i] + lengths[i]], the row may grow
+    up to indptr[i+1]. Free entries have index 0 and value 0 in values, so adjacency() is a scipy CSR
+    matrix of the graph without copying. When a row runs full, all rows are laid out anew with fresh room.
+    The arrays are typed arrays (see CSRGraph.adjacencyLists) with numpy views on them.
+
+    Arguments:
+        number_of_nodes -- the number of nodes N
+        edges -- integer array of shape (E, 2) with the node indices of the initial edges, each edge once
+    """
+
+    def __init__(self, number_of_nodes, edges=np.zeros((0, 2), dtype=np.int64)):
+        self.number_of_nodes = number_of_nodes
+        self._layout(np.asarray(edges, dtype=np.int64).reshape(-1, 2))
+
+    def _layout(self, edges):
+        """Lays out the rows of the given edges, every row with free room"""
+
+        N = self.number_of_nodes
+        u, v = edges[:, 0], edges[:, 1]
+        loop = u == v
+        src = np.concatenate([u, v[~loop]])
+        dst = np.concatenate([v, u[~loop]])
+        order = np.argsort(src, kind='stable')
+        src, dst = src[order], dst[order]
+        lengths = np.bincount(src, minlength=N)
+        indptr = np.zeros(N + 1, dtype=np.int64)
+        np.cumsum(2 * lengths + ROW_SLACK, out=indptr[1:])
+        positions = indptr[src] + np.arange(len(src)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        indices = np.zeros(indptr[-1], dtype=np.int64)
+        values = np.zeros(indptr[-1])
+        indices[positions] = dst
+        values[positions] = 1.0
+        self.indptr_list = array('q', indptr.tobytes())
+        self.lengths_list = array('q', lengths.astype(np.int64).tobytes())
+        self.indices_list = array('q', indices.tobytes())
+        self.indptr = np.frombuffer(self.indptr_list, dtype=np.int64)
+        self.lengths = np.frombuffer(self.lengths_list, dtype=np.int64)
+        self.indices = np.frombuffer(self.indices_list, dtype=np.int64)
+        self.values = values
+
+    def __len__(self):
+        return self.number_of_nodes
+
+    def number_of_edges(self):
+        """Returns the number of undirected edges (a self-loop counts once)"""
+
+        return int((self.lengths.sum() + self.selfLoops().sum()) // 2)
+
+    def degrees(self):
+        """Returns the number of neighbour entries per node (a self-loop counts once)"""
+
+        return self.lengths.copy()
+
+    def edges(self):
+        """Returns the edges as an integer array of shape (E, 2), every edge once with the smaller index first"""
+
+        rows = np.repeat(np.arange(self.number_of_nodes), np.diff(self.indptr))
+        used = self.values != 0
+        src, dst = rows[used], self.indices[used]
+        upper = src <= dst
+        return np.column_stack((src[upper], dst[upper]))
+
+    def selfLoops(self):
+        """Returns a boolean array marking the nodes that are their own neighbour"""
+
+        rows = np.repeat(np.arange(self.number_of_nodes), np.diff(self.indptr))
+        used = self.values != 0
+        return np.bincount(rows[used & (self.indices == rows)], minlength=self.number_of_nodes) > 0
+
+    def neighbours(self, node):
+        """Returns the neighbours of a node as a numpy array (a view, valid until the graph changes)"""
+
+        start = self.indptr_list[node]
+        return self.indices[start:start + self.lengths_list[node]]
+
+    def addEdges(self, edges):
+        """Adds edges that are not yet in the graph
+
+        Arguments:
+            edges -- integer array of shape (E, 2) with node indices, each edge once
+        """
+
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        u, v = edges[:, 0], edges[:, 1]
+        loop = u == v
+        src = np.concatenate([u, v[~loop]])
+        dst = np.concatenate([v, u[~loop]])
+        counts = np.bincount(src, minlength=self.number_of_nodes)
+        if np.any(self.lengths + counts > np.diff(self.indptr)):
+            self._layout(np.concatenate([self.edges(), edges]))
+            return
+        order = np.argsort(src, kind='stable')
+        src, dst = src[order], dst[order]
+        rank = np.arange(len(src)) - np.repeat(np.cumsum(counts) - counts, counts)
+        positions = self.indptr[src] + self.lengths[src] + rank
+        self.indices[positions] = dst
+        self.values[positions] = 1.0
+        self.lengths += counts
+
+    def removeEdges(self, edges):
+        """Removes edges of the graph, raises a ValueError for an edge that is not in the graph
+
+        Arguments:
+            edges -- integer array of shape (E, 2) with node indices, each edge once
+        """
+
+        indptr, lengths, indices, values = self.indptr_list, self.lengths_list, self.indices_list, self.values
+        for u, v in np.asarray(edges, dtype=np.int64).reshape(-1, 2).tolist():
+            for src, dst in ((u, v), (v, u)) if u != v else ((u, v),):
+                start = indptr[src]
+                last = start + lengths[src] - 1
+                try:
+                    position = indices.index(dst, start, last + 1)
+                except ValueError:
+                    raise ValueError("Edge (%d, %d) is not in the graph" % (u, v))
+                indices[position] = indices[last]
+                indices[last] = 0
+                values[last] = 0.0
+                lengths[src] -= 1
+
+    def adjacency(self):
+        """Returns the adjacency matrix as a scipy.sparse CSR matrix sharing the arrays of the graph"""
+
+        N = self.number_of_nodes
+        return scipy.sparse.csr_matrix((self.values, self.indices, self.indptr), shape=(N, N), copy=False)
+
+    def toCSRGraph(self, nodes=None):
+        """Returns the current graph as a (compact) CSRGraph, e.g. to run the static engines on a snapshot
+
+        Arguments:
+            nodes -- the node labels (default: the indices)
+        """
+
+        return CSRGraph.fromEdges(self.edges(), self.number_of_nodes, nodes)
+
+
+class SnapshotSeries(object):
+    """Series of snapshots of a graph stored as the edges of the first snapshot and the edge changes to every next one
+
+    The nodes of all snapshots are numbered together (a node missing in a snapshot has no edges there),
+    edges are integer arrays of shape (E, 2) with the smaller node index first.
+
+    Arguments:
+        nodes -- the node labels, ordered by index
+        names -- the names of the snapshots (e.g. their dates)
+        base -- the edges of the first snapshot
+        deltas -- one pair (added, removed) of edge arrays per further snapshot
+    """
+
+    def __init__(self, nodes, names, base, deltas):
+        self.nodes = list(nodes)
+        self.names = list(names)
+        self.base = np.asarray(base, dtype=np.int64).reshape(-1, 2)
+        self.deltas = [(np.asarray(added, dtype=np.int64).reshape(-1, 2), np.asarray(removed, dtype=np.int64).reshape(-1, 2))
+                       for added, removed in deltas]
+        self._index = None
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def index(self):
+        """Dictionary mapping node labels to indices"""
+
+        if self._index is None:
+            self._index = {node: i for i, node in enumerate(self.nodes)}
+        return self._index
+
+    def toIndices(self, nodes):
+        """Maps an iterable of node labels to a list of indices"""
+
+        index = self.index
+        return [index[node] for node in nodes]
+
+    @classmethod
+    def fromGraphs(cls, graphs, names=None):
+        """Builds a series from the snapshots given as CSRGraphs
+
+        Arguments:
+            graphs -- CSRGraphs of the snapshots, in order
+            names -- the names of the snapshots (default: their positions)
+        """
+
+        labelled = []
+        for H in graphs:
+            upper = H.sources <= H.indices
+            labels = np.asarray(H.nodes, dtype=np.int64)
+            labelled.append(np.column_stack((labels[H.sources[upper]], labels[H.indices[upper]])))
+        nodes, inverse = np.unique(np.concatenate([edges.reshape(-1) for edges in labelled] + [np.zeros(0, np.int64)]),
+                                   return_inverse=True)
+        N = len(nodes)
+        keys, offset = [], 0
+        for edges in labelled:
+            pairs = inverse[offset:offset + edges.size].reshape(-1, 2)
+            offset += edges.size
+            keys.append(np.unique(pairs.min(axis=1) * N + pairs.max(axis=1)))
+        deltas = [(np.setdiff1d(new, old, assume_unique=True), np.setdiff1d(old, new, assume_unique=True))
+                  for old, new in zip(keys[:-1], keys[1:])]
+        base = keys[0] if keys else np.zeros(0, dtype=np.int64)
+        return cls(nodes.tolist(), names if names is not None else list(range(len(keys))), _pairs(base, N),
+                   [(_pairs(added, N), _pairs(removed, N)) for added, removed in deltas])
+
+    @classmethod
+    def fromEdgeLists(cls, paths, elementSeparator=None, names=None):
+        """Builds a series from edge list files (integer node labels, the same label meaning the same node)
+
+        Arguments:
+            paths -- the edge list files of the snapshots, in order
+            elementSeparator -- character seperating the two connected nodes, or a list with one per file
+                (default None: any whitespace)
+            names -- the names of the snapshots (default: the file names without extension)
+
+        Raises a ValueError if a file cannot be read as an edge list.
+        """
+
+        separators = elementSeparator if isinstance(elementSeparator, (list, tuple)) else [elementSeparator] * len(paths)
+        graphs = []
+        for path, separator in zip(paths, separators):
+            H = loadEdgeList(path, separator, output='csr')
+            if H is None:
+                raise ValueError("Cannot load the snapshot " + path)
+            graphs.append(H)
+        if names is None:
+            names = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+        return cls.fromGraphs(graphs, names)
+
+    def save(self, path):
+        """Writes the series into a single .npz file (node labels must be integers)
+
+        Arguments:
+            path -- the target file
+        """
+
+        arrays = {'nodes': np.asarray(self.nodes, dtype=np.int64), 'names': np.asarray(self.names, dtype=str),
+                  'base': self.base}
+        for i, (added, removed) in enumerate(self.deltas):
+            arrays['added_%d' % i] = added
+            arrays['removed_%d' % i] = removed
+        with open(path + '.%d.tmp' % os.getpid(), 'wb') as seriesFile:
+            np.savez_compressed(seriesFile, **arrays)
+        os.replace(path + '.%d.tmp' % os.getpid(), path)
+
+    @classmethod
+    def load(cls, path):
+        """Reads a series written by save
+
+        Arguments:
+            path -- the file written by save
+        """
+
+        with np.load(path) as arrays:
+            names = arrays['names'].tolist()
+            deltas = [(arrays['added_%d' % i], arrays['removed_%d' % i]) for i in range(len(names) - 1)]
+            return cls(arrays['nodes'].tolist(), names, arrays['base'], deltas)
+
+    def baseGraph(self):
+        """Returns a DynamicGraph of the first snapshot"""
+
+        return DynamicGraph(len(self.nodes), self.base)
+
+    def graphs(self):
+        """Yields name, DynamicGraph for every snapshot in order; one graph is changed in place from one to the next"""
+
+        G = self.baseGraph()
+        yield self.names[0], G
+        for name, (added, removed) in zip(self.names[1:], self.deltas):
+            G.removeEdges(removed)
+            G.addEdges(added)
+            yield name, G
+
+    def eigenvalues(self):
+        """Returns the largest eigenvalue of the adjacency matrix of every snapshot
+
+        The eigenvector of each snapshot is the start vector of the iteration for the next one,
+        which takes few iterations when the snapshots differ in a small part of their edges.
+        """
+
+        eigs = []
+        vector = None
+        for _, G in self.graphs():
+            if not G.lengths.any():
+                eigs.append(0.0)
+                continue
+            # the offset keeps the start vector from vanishing where the old eigenvector was (numerically) zero
+            v0 = None if vector is None else np.abs(vector) + 1e-6
+            eig, vector = maxEigPair(G.adjacency(), v0=v0, tol=EIG_TOL)
+            eigs.append(float(eig))
+        return np.array(eigs)
+
+
+def _pairs(keys, number_of_nodes):
+    """Turns edge keys u*N+v back into an edge array of shape (E, 2)"""
+
+    return np.column_stack(np.divmod(keys, number_of_nodes)).astype(np.int64).reshape(-1, 2)
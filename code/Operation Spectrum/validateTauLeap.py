@@ -0,0 +1,82 @@
+"""
+Run this file to validate the tau-leaping engine against the exact Gillespie engine
+
+For every bundled data set, effective strength and accuracy, the final numbers of cured nodes of many
+simulations of tau_leap_SIR and Gillespie_SIR_CSR (same initially infected nodes, independent seeds) are
+compared by a two-sample Kolmogorov-Smirnov test. The mean final sizes, the test statistic, its p-value and
+the wall times of both engines are printed.
+
+Usage:
+    python validateTauLeap.py [--runs N] [--strengths S [S ...]] [--epsilons E [E ...]] [--alpha P] [--seed SEED]
+
+    --runs -- simulations per engine and configuration (default: 200)
+    --strengths -- effective strengths eig*tau/gamma (default: 1.5 3 10)
+    --epsilons -- accuracy parameters of tau_leap_SIR (default: 0.03)
+    --alpha -- significance level below which a p-value counts as a mismatch (default: 0.01)
+    --seed -- seed of the simulations (default: 0)
+
+The exit code is 1 if a mismatch was found.
+"""
+
+import argparse
+import random
+import sys
+import time
+import numpy as np
+import scipy.stats
+from benchmark import DATASETS
+from calculateLambda import obtainMaxEig
+from fetchData import loadGraph
+from gillespieAlgorithm import Gillespie_SIR_CSR, tau_leap_SIR
+from sirFunctions import replicate_seeds
+
+INITIAL_SIZE = 5  # number of initially infected nodes
+
+
+def finalSizes(engine, H, tau, gamma, initial_infecteds, seeds, **parameters):
+    """Returns the final numbers of cured nodes of one simulation per seed and the total wall time"""
+
+    sizes = []
+    started = time.perf_counter()
+    for seed in seeds:
+        random.seed(seed)
+        sizes.append(int(engine(H, tau, gamma, initial_infecteds, final_only=True, **parameters)[3][-1]))
+    return np.array(sizes), time.perf_counter() - started
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(description="Compares the final sizes of tau_leap_SIR and Gillespie_SIR_CSR")
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--strengths', type=float, nargs='+', default=[1.5, 3, 10])
+    parser.add_argument('--epsilons', type=float, nargs='+', default=[0.03])
+    parser.add_argument('--alpha', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=0)
+    options = parser.parse_args(arguments)
+
+    gamma = 1.0
+    mismatches = 0
+    print("%-14s %8s %8s %10s %10s %8s %8s %9s %9s" % ("data set", "strength", "epsilon", "exact", "leaping",
+                                                        "KS", "p", "t exact", "t leap"))
+    for name, path, separator in DATASETS:
+        H = loadGraph(path, separator, output='csr')
+        eig = obtainMaxEig(H)
+        initial_infecteds = random.Random(options.seed).sample(H.nodes, INITIAL_SIZE)
+        for strength in options.strengths:
+            tau = strength * gamma / eig
+            seeds = replicate_seeds(options.seed, 2 * options.runs)
+            exact, exact_time = finalSizes(Gillespie_SIR_CSR, H, tau, gamma, initial_infecteds, seeds[:options.runs])
+            for epsilon in options.epsilons:
+                leaping, leap_time = finalSizes(tau_leap_SIR, H, tau, gamma, initial_infecteds, seeds[options.runs:],
+                                                epsilon=epsilon)
+                test = scipy.stats.ks_2samp(exact, leaping)
+                mismatch = test.pvalue < options.alpha
+                mismatches += mismatch
+                print("%-14s %8g %8g %10.1f %10.1f %8.3f %8.3f %8.2fs %8.2fs%s" % (
+                    name, strength, epsilon, exact.mean(), leaping.mean(), test.statistic, test.pvalue,
+                    exact_time, leap_time, "  MISMATCH" if mismatch else ""))
+    print(str(mismatches) + " mismatches")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
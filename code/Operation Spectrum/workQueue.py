@@ -0,0 +1,578 @@
+"""
+Run this file to distribute the sweeps of a job file (see batchRunner.py) over several processes or machines
+
+A sweep is split into independent tasks, one per job, initial size, effective strength and part of the
+replicate seeds of the point. Workers lease tasks from a work queue, simulate them and push the partial sums
+of the final numbers of cured nodes back. A lease that is not completed in time (e.g. because the worker
+crashed) expires and the task is handed out again; as every task has fixed seeds, a task done twice gives
+the same result. The merged points do not depend on which worker did what and equal the points
+batchRunner.py computes for the same job file (up to the rounding of the interval bounds). The batch engines
+(sirFunctions.BATCH_ENGINES) draw all simulations of a point from one seed and cannot be split, jobs using
+them are rejected.
+
+Two backends are provided:
+    FileQueue -- a directory (e.g. on a shared file system) holding the tasks, leases and results as files
+    QueueServer / SocketQueue -- a coordinator serving a queue over TCP and the client used by the workers
+
+Usage:
+    python workQueue.py submit JOBFILE --queue DIR [--runs-per-task N]
+    python workQueue.py serve JOBFILE [--host HOST] [--port PORT] [--queue DIR] [--runs-per-task N] [--output FILE]
+    python workQueue.py work (--queue DIR | --connect HOST:PORT) [--root DIR] [--processes N] [--lease SECONDS]
+    python workQueue.py merge --queue DIR [--output FILE]
+    python workQueue.py local JOBFILE [--backend file|socket] [--queue DIR] [--processes N] [--lease SECONDS]
+                              [--runs-per-task N] [--output FILE]
+
+    submit -- writes the tasks of a job file into a FileQueue directory
+    serve -- serves the tasks of a job file (kept in memory, or in a FileQueue if --queue is given) over TCP
+        until all are done, then writes the merged points
+    work -- runs worker processes until the queue has no open tasks left (exit code 1 if a task failed)
+    merge -- writes the merged points of the finished tasks of a FileQueue
+    local -- all of the above on this machine with the given number of worker processes (default: one per core),
+        the file backend uses a temporary queue directory unless --queue is given
+
+    --runs-per-task -- replicate simulations per task (default: 20)
+    --root -- the directory the data set paths of the tasks are relative to (default: the current directory;
+        serve, submit and local use the directory of the job file)
+    --lease -- seconds a worker may take for a task before it is handed out again (default: 600)
+
+The output has the JSON lines of batchRunner.py (a 'point' per sweep point, a 'job' per job). The job keys
+rel_width, batch, workers and store are not used here; every point runs exactly iterations simulations.
+Leases compare wall clock times, so the clocks of the machines sharing a queue should agree.
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+from batchRunner import DEFAULTS, betaRange, jobSeeds
+from calculateLambda import obtainMaxEig
+from centrality import centralityIndex
+from fetchData import loadGraph
+from sirFunctions import BATCH_ENGINES, final_sizes, random_initial_nodes, replicate_seeds, tipping_point
+
+RUNS_PER_TASK = 20  # replicate simulations per task
+LEASE_SECONDS = 600  # time a worker may take for a task before it is handed out again
+POLL_SECONDS = 1.0  # wait of an idle worker before it asks again for a task
+
+
+def sweepTasks(specification, directory, runs_per_task=RUNS_PER_TASK):
+    """Returns the tasks of a job file specification as a list of JSON serializable dictionaries
+
+    The coordinator loads every data set once to fix the eigenvalue and the initially infected nodes of the
+    tasks, so all workers simulate exactly the same points.
+
+    Arguments:
+        specification -- the content of a job file (see batchRunner.py)
+        directory -- the directory the data set paths of the jobs are relative to
+        runs_per_task -- replicate simulations per task (default: RUNS_PER_TASK)
+    """
+
+    defaults = dict(DEFAULTS)
+    defaults.update(specification.get('defaults', {}))
+    jobs = [dict(defaults, **job) for job in specification['jobs']]
+    seeds = jobSeeds(defaults['seed'], defaults['seed_strategy'], len(jobs))
+    tasks = []
+    for k, job in enumerate(jobs):
+        seed = job['seed'] if 'seed' in specification['jobs'][k] else seeds[k]
+        if seed is None:
+            raise ValueError("Job %d has no seed, distributed sweeps need seeded jobs" % k)
+        if job['engine'] in BATCH_ENGINES:
+            raise ValueError("Job %d uses the batch engine %s, its simulations cannot be split into tasks" % (k, job['engine']))
+        G = loadGraph(os.path.join(directory, job['dataset']), job['separator'], output='csr')
+        if G is None:
+            raise ValueError("Cannot load " + job['dataset'])
+        eig = float(obtainMaxEig(G))
+        betas = betaRange(job['betas'])
+        point_seeds = replicate_seeds(seed, len(job['initial_sizes']) * len(betas))
+        for j, initial_size in enumerate(job['initial_sizes']):
+            for i, beta in enumerate(betas):
+                point_seed = point_seeds[j * len(betas) + i]
+                if job['initial_nodes'] == 'random':
+                    initial_nodes = random_initial_nodes(G, initial_size, point_seed)
+                else:
+                    initial_nodes = centralityIndex(G, job['initial_nodes']).top(initial_size)
+                replicates = replicate_seeds(point_seed, job['iterations'])
+                for b, start in enumerate(range(0, len(replicates), runs_per_task)):
+                    tasks.append({'id': "k%04d-s%03d-b%04d-r%05d" % (k, j, i, b), 'job': k, 'name': job.get('name', k),
+                                  'dataset': job['dataset'], 'separator': job['separator'], 'engine': job['engine'],
+                                  'eig': eig, 'initial_size': initial_size, 'initial_nodes': initial_nodes,
+                                  'beta': beta, 'end_time': job['end_time'], 'point_seed': point_seed,
+                                  'seeds': replicates[start:start + runs_per_task]})
+    return tasks
+
+
+def runTask(task, root, graphs):
+    """Simulates a task and returns its partial result (runs, sum and sum of squares of the final sizes)
+
+    Arguments:
+        task -- a task of sweepTasks
+        root -- the directory the data set path of the task is relative to
+        graphs -- dictionary keeping the loaded graphs of the worker between tasks
+    """
+
+    started = time.perf_counter()
+    engine = task['engine']
+    key = (task['dataset'], task['separator'], engine == 'gillespie')
+    if key not in graphs:
+        graphs[key] = loadGraph(os.path.join(root, task['dataset']), task['separator'],
+                                output='graph' if engine == 'gillespie' else 'csr')
+    sizes = final_sizes(graphs[key], task['beta'], task['eig'], task['initial_nodes'], task['end_time'], task['seeds'], engine)
+    # the final sizes are integers, so the sums are exact and the merge does not depend on the order of the tasks
+    sizes = [int(round(size)) for size in np.asarray(sizes).tolist()]
+    return {'id': task['id'], 'runs': len(sizes), 'sum': sum(sizes), 'sum_squares': sum(size * size for size in sizes),
+            'seconds': time.perf_counter() - started}
+
+
+def mergeResults(tasks, results, confidence=0.95):
+    """Returns the merged points and job summaries as lists of JSON serializable dictionaries
+
+    Points with missing results are left out.
+
+    Arguments:
+        tasks -- the tasks of the sweep
+        results -- dictionary from task id to partial result
+        confidence -- the confidence level of the intervals (default: 0.95)
+    """
+
+    points = {}
+    for task in sorted(tasks, key=lambda task: task['id']):
+        point_id = task['id'].rsplit('-', 1)[0]
+        if point_id not in points:
+            points[point_id] = {'task': task, 'runs': 0, 'sum': 0, 'sum_squares': 0, 'complete': True}
+        point = points[point_id]
+        result = results.get(task['id'])
+        if result is None:
+            point['complete'] = False
+            continue
+        for name in ('runs', 'sum', 'sum_squares'):
+            point[name] += result[name]
+
+    merged, curves = [], {}
+    for point_id in sorted(points):
+        point = points[point_id]
+        if not point['complete']:
+            continue
+        task = point['task']
+        mean, low, high = _interval(point['runs'], point['sum'], point['sum_squares'], confidence)
+        merged.append({'type': 'point', 'job': task['name'], 'dataset': task['dataset'], 'engine': task['engine'],
+                       'initial_size': task['initial_size'], 'beta': task['beta'], 'mean': mean,
+                       'interval': [low, high], 'runs': point['runs'], 'seed': task['point_seed']})
+        curves.setdefault(task['job'], {}).setdefault(task['initial_size'], []).append((task['beta'], mean))
+    summaries = []
+    for k in sorted(curves):
+        task = next(task for task in tasks if task['job'] == k)
+        thresholds = [tipping_point(*zip(*curve)) if len(curve) > 1 else None for curve in curves[k].values()]
+        summaries.append({'type': 'job', 'job': task['name'], 'dataset': task['dataset'], 'eig': task['eig'],
+                          'initial_sizes': list(curves[k]), 'tipping_points': thresholds})
+    return merged, summaries
+
+
+def _interval(runs, total, total_squares, confidence):
+    """Returns the mean and the Student t confidence interval of a sample given by its size, sum and sum of squares"""
+
+    mean = total / runs
+    if runs < 2:
+        return mean, -np.inf, np.inf
+    import scipy.stats
+    variance = max(total_squares - total * total / runs, 0) / (runs - 1)
+    half_width = float(scipy.stats.t.ppf((1 + confidence) / 2, runs - 1) * np.sqrt(variance / runs))
+    return mean, mean - half_width, mean + half_width
+
+
+class MemoryQueue(object):
+    """Work queue held in memory, e.g. behind a QueueServer
+
+    All queues provide submit, tasks, lease, complete, results and pending; lease returns None when no task can
+    be handed out right now (all are done or leased), pending is the number of tasks without a result.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+        self._leases = {}
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def submit(self, tasks):
+        with self._lock:
+            for task in tasks:
+                self._tasks.setdefault(task['id'], task)
+
+    def tasks(self):
+        with self._lock:
+            return [self._tasks[task_id] for task_id in sorted(self._tasks)]
+
+    def lease(self, worker, seconds=LEASE_SECONDS):
+        now = time.time()
+        with self._lock:
+            for task_id in sorted(self._tasks):
+                if task_id in self._results or self._leases.get(task_id, (None, 0))[1] > now:
+                    continue
+                self._leases[task_id] = (worker, now + seconds)
+                return self._tasks[task_id]
+        return None
+
+    def complete(self, result):
+        with self._lock:
+            self._results.setdefault(result['id'], result)
+            self._leases.pop(result['id'], None)
+
+    def results(self):
+        with self._lock:
+            return dict(self._results)
+
+    def pending(self):
+        with self._lock:
+            return len(self._tasks) - len(self._results)
+
+
+class FileQueue(object):
+    """Work queue in a directory with the subdirectories tasks, leases and results, one JSON file per task in each
+
+    A lease is taken by creating its file exclusively; an expired lease is first renamed away. Two workers
+    seeing the same expired lease may both take the task (the second rename can remove the fresh lease of the
+    first), which only costs time: a task done twice gives the same result. Results are written atomically,
+    so a crashed worker leaves either a whole result or none.
+    The directory may be shared by several machines (e.g. over NFS).
+
+    Arguments:
+        directory -- the directory of the queue, created if it does not exist
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        for name in ('tasks', 'leases', 'results'):
+            os.makedirs(os.path.join(directory, name), exist_ok=True)
+        self._task_ids = None
+
+    def _path(self, kind, task_id):
+        return os.path.join(self.directory, kind, task_id + '.json')
+
+    def _ids(self, kind):
+        return set(name[:-5] for name in os.listdir(os.path.join(self.directory, kind)) if name.endswith('.json'))
+
+    @staticmethod
+    def _read(path):
+        with open(path) as queueFile:
+            return json.load(queueFile)
+
+    @staticmethod
+    def _write(path, content):
+        with open(path + '.%d.tmp' % os.getpid(), 'w') as queueFile:
+            json.dump(content, queueFile)
+        os.replace(path + '.%d.tmp' % os.getpid(), path)
+
+    def submit(self, tasks):
+        existing = self._ids('tasks')
+        for task in tasks:
+            if task['id'] not in existing:
+                self._write(self._path('tasks', task['id']), task)
+        self._task_ids = None
+
+    def tasks(self):
+        return [self._read(self._path('tasks', task_id)) for task_id in sorted(self._ids('tasks'))]
+
+    def lease(self, worker, seconds=LEASE_SECONDS):
+        if self._task_ids is None:
+            self._task_ids = sorted(self._ids('tasks'))
+        done = self._ids('results')
+        leased = self._ids('leases')
+        for task_id in self._task_ids:
+            if task_id in done:
+                continue
+            path = self._path('leases', task_id)
+            if task_id in leased:
+                try:
+                    if self._read(path)['expires'] > time.time():
+                        continue
+                    stale = path + '.%s.expired' % worker
+                    os.rename(path, stale)
+                    os.remove(stale)
+                except (OSError, ValueError, KeyError):
+                    continue  # another worker took or is just writing the lease
+            try:
+                descriptor = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except OSError:
+                continue
+            with os.fdopen(descriptor, 'w') as leaseFile:
+                json.dump({'worker': worker, 'expires': time.time() + seconds}, leaseFile)
+            if os.path.exists(self._path('results', task_id)):
+                os.remove(path)
+                continue
+            return self._read(self._path('tasks', task_id))
+        return None
+
+    def complete(self, result):
+        self._write(self._path('results', result['id']), result)
+        try:
+            os.remove(self._path('leases', result['id']))
+        except OSError:
+            pass
+
+    def results(self):
+        return {task_id: self._read(self._path('results', task_id)) for task_id in self._ids('results')}
+
+    def pending(self):
+        return len(self._ids('tasks') - self._ids('results'))
+
+
+class _QueueRequestHandler(socketserver.StreamRequestHandler):
+    """Answers one JSON line request {"op": ..., "args": [...]} with one JSON line {"value": ...}"""
+
+    def handle(self):
+        for line in self.rfile:
+            request = json.loads(line)
+            if request['op'] not in ('submit', 'tasks', 'lease', 'complete', 'results', 'pending'):
+                answer = {'error': "Unknown operation " + str(request['op'])}
+            else:
+                answer = {'value': getattr(self.server.queue, request['op'])(*request.get('args', []))}
+            self.wfile.write((json.dumps(answer) + '\n').encode())
+
+
+class QueueServer(socketserver.ThreadingTCPServer):
+    """TCP server handing out the tasks of a queue (e.g. a MemoryQueue) to SocketQueue clients
+
+    Arguments:
+        queue -- the served queue
+        host -- the address to listen on (default: '127.0.0.1', only this machine)
+        port -- the port to listen on (default: 0, any free port; see server_address)
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, queue, host='127.0.0.1', port=0):
+        self.queue = queue
+        socketserver.ThreadingTCPServer.__init__(self, (host, port), _QueueRequestHandler)
+
+
+class SocketQueue(object):
+    """Client of a QueueServer with the methods of the queues
+
+    Arguments:
+        address -- the pair (host, port) of the server
+    """
+
+    def __init__(self, address):
+        self.address = tuple(address)
+        self._connection = None
+
+    def _call(self, op, *args):
+        for attempt in range(2):
+            try:
+                if self._connection is None:
+                    connection = socket.create_connection(self.address)
+                    self._connection = (connection, connection.makefile('r'))
+                connection, reader = self._connection
+                connection.sendall((json.dumps({'op': op, 'args': list(args)}) + '\n').encode())
+                line = reader.readline()
+                if not line:
+                    raise ConnectionError("Queue server closed the connection")
+                break
+            except OSError:
+                self.close()
+                if attempt:
+                    raise
+        answer = json.loads(line)
+        if 'error' in answer:
+            raise ValueError(answer['error'])
+        return answer['value']
+
+    def close(self):
+        if self._connection is not None:
+            self._connection[1].close()
+            self._connection[0].close()
+            self._connection = None
+
+    def submit(self, tasks):
+        return self._call('submit', tasks)
+
+    def tasks(self):
+        return self._call('tasks')
+
+    def lease(self, worker, seconds=LEASE_SECONDS):
+        return self._call('lease', worker, seconds)
+
+    def complete(self, result):
+        return self._call('complete', result)
+
+    def results(self):
+        return self._call('results')
+
+    def pending(self):
+        return self._call('pending')
+
+
+def work(queue, root, worker=None, lease_seconds=LEASE_SECONDS, poll_seconds=POLL_SECONDS):
+    """Runs tasks of a queue until none is open anymore and returns the number of tasks done
+
+    The worker also stops when the queue cannot be reached anymore (an OSError of the queue, e.g. because the
+    server is gone). A task that fails (e.g. because its data set is missing under root) is reported on
+    standard error and its exception is raised; its lease expires, so another worker can take the task.
+
+    Arguments:
+        queue -- the queue (FileQueue or SocketQueue)
+        root -- the directory the data set paths of the tasks are relative to
+        worker -- the name of this worker in the leases (default: host name and process id)
+        lease_seconds -- time this worker may take for a task (default: LEASE_SECONDS)
+        poll_seconds -- wait before asking again while all open tasks are leased (default: POLL_SECONDS)
+    """
+
+    worker = worker or "%s-%d" % (socket.gethostname(), os.getpid())
+    graphs = {}
+    done = 0
+    while True:
+        try:
+            task = queue.lease(worker, lease_seconds)
+            if task is None:
+                if not queue.pending():
+                    return done
+                time.sleep(poll_seconds)  # leases of other workers may still expire
+                continue
+        except OSError:
+            return done  # the queue server is gone
+        try:
+            result = runTask(task, root, graphs)
+        except Exception as error:
+            print("Worker %s failed on task %s: %s: %s" % (worker, task['id'], type(error).__name__, error),
+                  file=sys.stderr)
+            raise
+        try:
+            queue.complete(result)
+        except OSError:
+            return done
+        done += 1
+
+
+def _workProcess(backend, location, root, lease_seconds, poll_seconds):
+    """Entry point of a worker process started by startWorkers"""
+
+    queue = FileQueue(location) if backend == 'file' else SocketQueue(location)
+    work(queue, root, lease_seconds=lease_seconds, poll_seconds=poll_seconds)
+
+
+def startWorkers(processes, backend, location, root, lease_seconds=LEASE_SECONDS, poll_seconds=POLL_SECONDS):
+    """Starts worker processes on this machine and returns them
+
+    Arguments:
+        processes -- the number of processes, None for one per CPU core
+        backend -- 'file' or 'socket'
+        location -- the FileQueue directory or the (host, port) of the QueueServer
+        root -- the directory the data set paths of the tasks are relative to
+        lease_seconds, poll_seconds -- see work
+    """
+
+    workers = [mp.Process(target=_workProcess, args=(backend, location, root, lease_seconds, poll_seconds))
+               for _ in range(processes or mp.cpu_count())]
+    for process in workers:
+        process.start()
+    return workers
+
+
+def _writeMerged(queue, output):
+    """Writes the merged points and job summaries of a queue as JSON lines, returns 1 if tasks are unfinished"""
+
+    tasks = queue.tasks()
+    points, summaries = mergeResults(tasks, queue.results())
+    stream = sys.stdout if output is None else open(output, 'a')
+    try:
+        for entry in points + summaries:
+            stream.write(json.dumps(entry) + '\n')
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+    unfinished = queue.pending()
+    if unfinished:
+        print(str(unfinished) + " tasks are not finished", file=sys.stderr)
+    return 1 if unfinished else 0
+
+
+def _loadTasks(jobfile, runs_per_task):
+    with open(jobfile) as jobFile:
+        specification = json.load(jobFile)
+    return sweepTasks(specification, os.path.dirname(os.path.abspath(jobfile)), runs_per_task)
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(description="Distributes the sweeps of a job file over worker processes")
+    parser.add_argument('command', choices=['submit', 'serve', 'work', 'merge', 'local'])
+    parser.add_argument('jobfile', nargs='?')
+    parser.add_argument('--queue', default=None)
+    parser.add_argument('--connect', default=None)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--backend', choices=['file', 'socket'], default='file')
+    parser.add_argument('--root', default=None)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--lease', type=float, default=LEASE_SECONDS)
+    parser.add_argument('--runs-per-task', type=int, default=RUNS_PER_TASK)
+    parser.add_argument('--output', default=None)
+    options = parser.parse_args(arguments)
+    if options.command in ('submit', 'serve', 'local') and options.jobfile is None:
+        parser.error(options.command + " needs a job file")
+    root = options.root or (os.path.dirname(os.path.abspath(options.jobfile)) if options.jobfile else os.getcwd())
+
+    if options.command == 'submit':
+        if options.queue is None:
+            parser.error("submit needs --queue")
+        FileQueue(options.queue).submit(_loadTasks(options.jobfile, options.runs_per_task))
+        return 0
+    if options.command == 'merge':
+        if options.queue is None:
+            parser.error("merge needs --queue")
+        return _writeMerged(FileQueue(options.queue), options.output)
+    if options.command == 'work':
+        if options.queue is not None:
+            workers = startWorkers(options.processes, 'file', options.queue, root, options.lease)
+        elif options.connect is not None:
+            host, port = options.connect.rsplit(':', 1)
+            workers = startWorkers(options.processes, 'socket', (host, int(port)), root, options.lease)
+        else:
+            parser.error("work needs --queue or --connect")
+        for process in workers:
+            process.join()
+        return 1 if any(process.exitcode for process in workers) else 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        if options.command == 'local' and options.backend == 'file' and options.queue is None:
+            options.queue = directory  # a queue only for this run
+        return _coordinate(options, root)
+
+
+def _coordinate(options, root):
+    """Runs the commands serve and local: submits the tasks, serves them and/or starts workers and merges"""
+
+    queue = MemoryQueue() if options.queue is None else FileQueue(options.queue)
+    queue.submit(_loadTasks(options.jobfile, options.runs_per_task))
+    server = None
+    if options.command == 'serve' or options.backend == 'socket':
+        server = QueueServer(queue, options.host, options.port)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print("Serving %d tasks on %s:%d" % (queue.pending(), server.server_address[0], server.server_address[1]),
+              file=sys.stderr)
+    workers = []
+    if options.command == 'local':
+        location = options.queue if options.backend == 'file' else server.server_address
+        workers = startWorkers(options.processes, options.backend, location, root, options.lease)
+    try:
+        while queue.pending():
+            if workers and not any(process.is_alive() for process in workers):
+                break  # all local workers died, the open tasks stay in the queue
+            time.sleep(POLL_SECONDS / 10)
+    finally:
+        for process in workers:
+            process.join()
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+    return _writeMerged(queue, options.output)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))